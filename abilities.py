@@ -0,0 +1,78 @@
+from field import *
+from math import ceil
+
+
+@ability_handler("send_out", "Intimidate")
+def intimidate(battle, mon: FieldMon):
+    battle.announce_ability(mon)
+    for opponent in battle.team(mon).opponent_mons:
+        if battle.are_adjacent(mon, opponent):
+            battle.apply_stat_change(opponent, {"Atk": -1})
+
+
+@ability_handler("send_out", *ruinous_abilities)
+def announce_ruin(battle, mon: FieldMon):
+    battle.announce_ability(mon)
+    battle.event("ruin", mon.team_id, mon.id, ruinous_abilities[mon.ability])
+
+
+@ability_handler("send_out", *weather_spawning_abilities)
+def spawn_weather(battle, mon: FieldMon):
+    battle.announce_ability(mon)
+    if battle.field.can_change_weather(weather_spawning_abilities[mon.ability]):
+        battle.change_weather(weather_spawning_abilities[mon.ability])
+
+
+@ability_handler("send_out", *terrain_spawning_abilities)
+def spawn_terrain(battle, mon: FieldMon):
+    battle.announce_ability(mon)
+    battle.change_terrain(terrain_spawning_abilities[mon.ability])
+
+
+@ability_handler("contact", "Aftermath")
+def aftermath(battle, defender: FieldMon, attacker: FieldMon, move: Move):
+    if defender.fainted:
+        battle.announce_ability(defender)
+        battle.damage(attacker, ceil(attacker.hp / 4))
+
+
+@ability_handler("contact", "Effect Spore")
+def effect_spore(battle, defender: FieldMon, attacker: FieldMon, move: Move):
+    if (r := random.random()) < 0.3 and not (grass in attacker.types):
+        condition = mild_poison if r < 0.1 else paralysis if r < 0.2 else sleep
+        if battle.field.can_apply_status(defender, attacker, condition):
+            battle.announce_ability(defender)
+            battle.apply_status(attacker, condition)
+
+
+@ability_handler("contact", "Flame Body")
+def flame_body(battle, defender: FieldMon, attacker: FieldMon, move: Move):
+    if random.random() < 0.3 and battle.field.can_apply_status(defender, attacker, burn):
+        battle.announce_ability(defender)
+        battle.apply_status(attacker, burn)
+
+
+@ability_handler("contact", "Gooey", "Tangling Hair")
+def gooey(battle, defender: FieldMon, attacker: FieldMon, move: Move):
+    battle.announce_ability(defender)
+    battle.apply_stat_change(attacker, {"Spe": -1})
+
+
+@ability_handler("contact", "Iron Barbs", "Rough Skin")
+def iron_barbs(battle, defender: FieldMon, attacker: FieldMon, move: Move):
+    battle.announce_ability(defender)
+    battle.damage(attacker, ceil(attacker.hp / 8))
+
+
+@ability_handler("contact", "Poison Point")
+def poison_point(battle, defender: FieldMon, attacker: FieldMon, move: Move):
+    if random.random() < 0.3 and battle.field.can_apply_status(defender, attacker, mild_poison):
+        battle.announce_ability(defender)
+        battle.apply_status(attacker, mild_poison)
+
+
+@ability_handler("contact", "Static")
+def static(battle, defender: FieldMon, attacker: FieldMon, move: Move):
+    if random.random() < 0.3 and battle.field.can_apply_status(defender, attacker, paralysis):
+        battle.announce_ability(defender)
+        battle.apply_status(attacker, paralysis)
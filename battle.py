@@ -1,6 +1,9 @@
 from controllers import *
-import time
+from abilities import *
+from sinks import *
+from collections import Counter
 from math import ceil
+import heapq
 
 
 stat_change_texts = {
@@ -38,14 +41,198 @@ terrain_texts = {
     misty_terrain: "Mist swirled around the battlefield!",
     psychic_terrain: "The battlefield got weird!"
 }
-announce_on_send_out = [  # Abilities that either proc immediately or should be announced when a mon is sent out.
-    "Intimidate",
-    *list(ruinous_abilities), *list(weather_spawning_abilities), *list(terrain_spawning_abilities)
-]
+screen_texts = {  # what each screen protects against
+    "Reflect": "physical moves", "Light Screen": "special moves", "Aurora Veil": "physical and special moves"
+}
+# Lines about a single mon, each an event of its own: {} is the mon's name, capitalized if it starts the line
+mon_texts = {
+    "thawed": "{} thawed out!", "frozen": "{} is frozen solid!", "fully_paralyzed": "{} is paralyzed! It can't move!",
+    "woke_up": "{} woke up!", "asleep": "{} is fast asleep.", "flinched": "{} flinched!",
+    "confusion_ended": "{} snapped out of its confusion!", "confused": "{} is confused!",
+    "protected": "{} protected itself!", "immune": "It doesn't affect {}...",
+    "psychic_terrain": "{} is protected by Psychic Terrain!", "avoided": "{} avoided the attack!",
+    "missed": "{}'s attack missed!", "thawed_by_move": "{} was thawed out!", "became_confused": "{} became confused!",
+    "after_you": "{} took the kind offer!", "trick_room": "{} twisted the dimensions!",
+    "drained": "{} had its energy drained!",
+    "unplugged": "{}'s Controller is unplugged. Try using a Player or BasicAI object."
+}
+# Structured output: Battle.event() renders these with the battle as the view, and BattleLogReader renders them from a
+# log with a LoggedBattle as the view. Mons are given as (team id, mon id); anything without an event is plain "text".
+event_texts = {
+    "text": lambda view, text: text,
+    "turn": lambda view, turn, spaced, details: ("\n" if spaced else "") + f"[ TURN {turn} ]\n{details}",
+    "recall": lambda view, team, mon: f"{view.team(team).trainer} recalled {view.team(team)[mon].name}!",
+    "send_out": lambda view, team, mon: f"{view.team(team).trainer} sent out {view.team(team)[mon].verbose_name}!",
+    "move": lambda view, team, mon, move: f"{view.name(view.team(team)[mon])} used {move}!",
+    "damage": lambda view, team, mon, amount, description, remaining_hp:
+        f"{view.name(view.team(team)[mon])} took {amount} {description}! "
+        f"(-> {remaining_hp}/{view.team(team)[mon].hp} HP)",
+    "heal": lambda view, team, mon, amount, description, remaining_hp:
+        f"{view.name(view.team(team)[mon])} regained {amount} {description}! "
+        f"(-> {remaining_hp}/{view.team(team)[mon].hp} HP)",
+    "crit": lambda view, team, mon, multiple_targets:
+        f"A critical hit on {view.name(view.team(team)[mon], False)}!" if multiple_targets else "A critical hit!",
+    "ability": lambda view, team, mon, ability: f"== {view.name(view.team(team)[mon])}'s {ability}! ==",
+    "stat_change": lambda view, team, mon, stat, change:
+        f"{view.name(view.team(team)[mon])}'s {stat_names[stat]} {stat_change_texts[change]}!",
+    "status": lambda view, team, mon, condition:
+        f"{view.name(view.team(team)[mon])} {status_condition_texts[condition]}!",
+    "weather": lambda view, weather, stage: weather_texts[weather][stage],  # stage: 0 started, 1 continues, 2 ended
+    "terrain": lambda view, terrain, ended:
+        f"The {terrain} terrain dissipated." if ended else terrain_texts[terrain],
+    "faint": lambda view, team, mon: f"{view.name(view.team(team)[mon])} fainted!",
+    "win": lambda view, team, spaced: ("\n" if spaced else "") + f"{view.team(team).trainer} wins!",
+    "effectiveness": lambda view, team, mon, multiple_targets, super_effective:
+        ("It's super effective" if super_effective else "It's not very effective") +
+        (f" on {view.name(view.team(team)[mon], False)}" if multiple_targets else "") +
+        ("!" if super_effective else "..."),
+    "screen_set": lambda view, team, screen: f"{screen} protected {view.possessive(team)} team against "
+                                             f"{screen_texts[screen]}!",
+    "screen_removed": lambda view, team, screen: f"{view.possessive(team, True)} team's {screen} was removed!",
+    "screen_ended": lambda view, team, screen: ("Your team's" if team == view.pov else "Opponent's") +
+                                               f" {screen} wore off!",
+    "ruin": lambda view, team, mon, stat:
+        f"{view.name(view.team(team)[mon])} lowered the {stat_names[stat]} of surrounding Pok\u00e9mon!",
+    "no_targets": lambda view, team, mon, move: f"{view.name(view.team(team)[mon])} has no valid targets for {move}!"
+} | {
+    k: lambda view, team, mon, text=v: text.format(view.name(view.team(team)[mon], text.startswith("{}")))
+    for k, v in mon_texts.items()
+}
+
+
+class BattleSnapshot:
+    """The state of a battle at some point, from Battle.snapshot(). Only valid for the battle it was taken from."""
+    __slots__ = ("turn_count", "last_output", "field", "teams", "rng")
+
+    def __init__(self, turn_count: int, last_output: str, field: tuple, teams: tuple, rng: tuple = None):
+        self.turn_count = turn_count
+        self.last_output = last_output
+        self.field = field
+        self.teams = teams
+        self.rng = rng
+
+
+class TurnQueue:
+    """The mons that have yet to act this turn, in a heap ordered the same way as Battle.turn_order()."""
+    def __init__(self, battle: "Battle", mons: list[FieldMon] = ()):
+        self.battle = battle
+        self.heap = []
+        self.keys = {}  # mon: its current key, for mons still waiting to move
+        self.tiebreaks = {}  # mon: random speed tiebreaker, drawn once per turn
+        self.count = 0  # so entries never fall back on comparing mons
+        for mon in mons:
+            self.add(mon)
+
+    def key(self, mon: FieldMon) -> tuple:
+        return (  # negated, since heapq pops the smallest
+            -mon.next_action_priority,
+            -self.battle.field.get_stat(mon, "Spe") * (-1 if self.battle.field.trick_room else 1),
+            -self.tiebreaks[mon],
+            -mon.position
+        )
+
+    def add(self, mon: FieldMon):
+        if mon not in self.tiebreaks:
+            self.tiebreaks[mon] = random.random()
+        self.keys[mon] = None
+        self.rekey(mon)
+
+    def rekey(self, mon: FieldMon = None):
+        """Recomputes the key for a mon, or for every waiting mon if none is given."""
+        for g in ([mon] if mon is not None else list(self.keys)):
+            if g in self.keys:
+                self.keys[g] = key = self.key(g)
+                self.count += 1
+                heapq.heappush(self.heap, (key, self.count, g))
+
+    def pop(self) -> FieldMon | None:
+        while self.heap:
+            key, _, mon = heapq.heappop(self.heap)
+            if self.keys.get(mon) != key:  # rekeyed since this entry was pushed, or already popped
+                continue
+            del self.keys[mon]
+            if not mon.has_taken_turn and not mon.fainted and self.battle.at(mon.position) is mon:
+                return mon
+        return None
+
+
+class BattleStats:
+    """Cumulative inclusive times and call counts for a battle's phases, and counts of each event."""
+    phases = ("turn_order", "next_to_move", "use_move", "move_effects", "end_of_turn", "send_out_replacements")
+    # methods timed under another phase's name: building and rekeying the TurnQueue is the per-turn cost of turn order
+    phase_parts = {"queue_turn": "turn_order", "reschedule": "turn_order"}
+
+    def __init__(self):
+        self.times = Counter()
+        self.calls = Counter()
+        self.events = Counter()
+
+    def timed(self, name: str, method):
+        times, calls = self.times, self.calls
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                times[name] += time.perf_counter() - start
+                calls[name] += 1
+        return wrapper
+
+    def timed_async(self, name: str, method):
+        times, calls = self.times, self.calls
+
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                times[name] += time.perf_counter() - start
+                calls[name] += 1
+        return wrapper
+
+    def counted(self, method):
+        events = self.events
+
+        def wrapper(name: str, *args, **kwargs):
+            events[name] += 1
+            return method(name, *args, **kwargs)
+        return wrapper
+
+    def attach(self, battle: "Battle"):
+        for name in self.phases:
+            setattr(battle, name, self.timed(name, getattr(battle, name)))
+        for name, phase in self.phase_parts.items():
+            setattr(battle, name, self.timed(phase, getattr(battle, name)))
+        battle.send_out_replacements_async = self.timed_async(
+            "send_out_replacements_async", battle.send_out_replacements_async
+        )
+        battle.field.damage_roll = self.timed("damage_roll", battle.field.damage_roll)
+        for team in battle.teams:
+            team.set_actions = self.timed("set_actions", team.set_actions)
+            team.set_actions_async = self.timed_async("set_actions_async", team.set_actions_async)
+        battle.event = self.counted(battle.event)
+
+    def merge(self, other: "BattleStats"):
+        self.times.update(other.times)
+        self.calls.update(other.calls)
+        self.events.update(other.events)
+
+    def json(self):
+        return {"times": dict(self.times), "calls": dict(self.calls), "events": dict(self.events)}
+
+    @staticmethod
+    def from_json(js: dict):
+        ret = BattleStats()
+        ret.times.update(js.get("times", {}))
+        ret.calls.update(js.get("calls", {}))
+        ret.events.update(js.get("events", {}))
+        return ret
 
 
 class Battle:
-    def __init__(self, teams: list[Controller], size: int = 1, pov: int = 0):
+    def __init__(self, teams: list[Controller], size: int = 1, pov: int = 0, sink: OutputSink = None, log=None,
+                 stats: BattleStats = None):
         self.teams = teams[:2]
         teams[0].change_id(0)
         teams[1].change_id(1)
@@ -54,33 +241,94 @@ class Battle:
             raise ValueError("Size must be between 1 and 3.")
         self.size = size
         self.pov = pov
+        self.sink = ConsoleSink() if sink is None else sink
+        self.log = log  # e.g. a BattleLogWriter, which records each event as it's output
 
         self.field = Field(size=self.size)
-        self.teams[0].set_field(self.field)
-        self.teams[1].set_field(self.field)
+        for team in self.teams:
+            team.set_field(self.field)
+            team.set_battle(self)
 
         self.last_output = ""
         self.turn_count = 0
+        self.queue = None  # TurnQueue while a turn is being resolved
+        self.remaining = [0, 0]  # non-fainted mons on each team, kept up to date by check_fainted()
+        self.count_remaining()
+
+        self.stats = stats
+        if stats is not None:
+            stats.attach(self)
+
+    def snapshot(self, include_rng: bool = False) -> BattleSnapshot:
+        """Everything that changes over a battle, for restore(); with include_rng, the random state too."""
+        return BattleSnapshot(
+            self.turn_count, self.last_output, self.field.save_state(), tuple(g.save_state() for g in self.teams),
+            random.getstate() if include_rng else None
+        )
+
+    def restore(self, snapshot: BattleSnapshot):
+        self.turn_count = snapshot.turn_count
+        self.last_output = snapshot.last_output
+        for team, state in zip(self.teams, snapshot.teams):
+            team.load_state(state)
+        self.field.load_state(snapshot.field)  # after the teams, since it rebuilds field.abilities from their mons
+        self.count_remaining()
+        if snapshot.rng is not None:
+            random.setstate(snapshot.rng)
+
+    def fork(self, controller: type = None) -> "Battle":
+        """An independent, silent copy of this battle, with each team as controller or its own class."""
+        teams = [(controller or type(g))(trainer=g.trainer, size=g._size) for g in self.teams]
+        ret = Battle(teams, self.size, self.pov, NullSink())
+        for team, copy in zip(self.teams, ret.teams):  # filled in after __init__, which would renumber the mons
+            for id_no, mon in team.mons.items():
+                copy.mons[id_no] = FieldMon.from_json(mon.json())
+                copy.mons[id_no].load_state(mon.save_state())
+            copy.order = list(team.order)
+        ret.turn_count = self.turn_count
+        ret.field.load_state(self.field.save_state())
+        ret.field.positions = {
+            k: None if v is None else ret.teams[v.team_id][v.id] for k, v in self.field.positions.items()
+        }
+        ret.field.update_abilities()
+        ret.count_remaining()
+        return ret
+
+    @property
+    def headless(self) -> bool:
+        return not self.sink.wants_diagrams
 
     def output(self, text: str, sleep_time: float = 0.5) -> None:
-        print(text)
+        if self.log is not None:
+            self.log.event("text", (text, ))
+        self.sink.write(text, sleep_time)
+        self.last_output = text.split("\n")[-1]
+
+    def event(self, name: str, *args, sleep_time: float = 0.5) -> None:
+        """Outputs one of the structured events in event_texts, which the log (if any) keeps as the event itself."""
+        if self.log is not None:
+            self.log.event(name, args)
+        text = event_texts[name](self, *args)
+        self.sink.write(text, sleep_time)
         self.last_output = text.split("\n")[-1]
-        if sleep_time:
-            time.sleep(sleep_time)
 
     def spaced(self, text: str) -> str:
         return ("\n" if self.last_output else "") + text
 
     def deploy_mon(self, team_id: int, mon_id: int, position: int, announce: bool = True, proc_ability: bool = True):
-        if packed_mon := self.teams[team_id][mon_id]:
+        if (mon := self.teams[team_id][mon_id]) is not None:
             if self.at(position):
                 if announce:
-                    self.output(f"{self.teams[team_id].trainer} recalled {self.at(position).name}!")
+                    self.event("recall", team_id, self.at(position).id)
                 self.teams[team_id].recall_mon(self.at(position))
-            self.field.deploy_mon(FieldMon.from_json(packed_mon | {"position": position}), position)
-            packed_mon["field_status"] = "on field"
+                self.at(position).position = -1
+            mon.position = position
+            mon.field_status = "on field"
+            self.field.deploy_mon(mon, position)
+            if self.queue is not None:
+                self.queue.add(mon)
             if announce:
-                self.output(f"{self.teams[team_id].trainer} sent out {self.at(position).verbose_name}!")
+                self.event("send_out", team_id, mon_id)
                 if proc_ability:
                     self.proc_ability_on_send_out(self.at(position))
         else:
@@ -118,6 +366,9 @@ class Battle:
         return self.field.get_stat(mon, stat)
 
     def init_battle(self):
+        self.count_remaining()
+        if self.log is not None:
+            self.log.begin(self)
         for n in range(self.size):
             self.deploy_mon(0, n, n, proc_ability=False)
         for n in range(self.size, self.size * 2):
@@ -127,10 +378,15 @@ class Battle:
             self.proc_ability_on_send_out(mon)
 
     def next_to_move(self) -> FieldMon | None:
-        try:
-            return self.turn_order()[0]
-        except IndexError:
-            return None
+        return self.queue.pop()
+
+    def queue_turn(self):
+        self.queue = TurnQueue(self, [g for g in self.fielded_mons if not g.has_taken_turn and not g.fainted])
+
+    def reschedule(self, mon: FieldMon = None):
+        """Call when something changes the speed or priority of a mon (or of every mon, if none is given)."""
+        if self.queue is not None:
+            self.queue.rekey(mon)
 
     def turn_order(self) -> list[FieldMon]:
         priorities = [
@@ -160,35 +416,19 @@ class Battle:
 
     def damage(self, mon: FieldMon, damage: int, description: str = "damage"):
         damage_dealt = mon.damage(damage)
-        self.output(f"{self.name(mon)} took {damage_dealt} {description}! (-> {mon.hp_display()} HP)")
+        self.event("damage", mon.team_id, mon.id, damage_dealt, description, mon.remaining_hp)
         self.check_fainted(mon)
 
     def heal(self, mon: FieldMon, healing: int, description: str = "HP"):
         healing_done = mon.heal(healing)
-        self.output(f"{self.name(mon)} regained {healing_done} {description}! (-> {mon.hp_display()} HP)")
+        self.event("heal", mon.team_id, mon.id, healing_done, description, mon.remaining_hp)
 
     def announce_ability(self, mon: FieldMon):
-        self.output(f"== {self.name(mon)}'s {mon.ability}! ==")
+        self.event("ability", mon.team_id, mon.id, mon.ability)
 
     def proc_ability_on_send_out(self, mon: FieldMon):
-        if not mon.has_ability(*announce_on_send_out):
-            return
-        self.announce_ability(mon)
-
-        if mon.has_ability("Intimidate"):
-            for opponent in self.team(mon).opponent_mons:
-                if self.are_adjacent(mon, opponent):
-                    self.apply_stat_change(opponent, {"Atk": -1})
-        if mon.has_ability(*list(ruinous_abilities)):
-            self.output(
-                f"{self.name(mon)} lowered the {stat_names[ruinous_abilities[mon.ability]]} "
-                f"of surrounding Pok\u00e9mon!"
-            )
-        if mon.has_ability(*list(weather_spawning_abilities)):
-            if self.field.can_change_weather(weather_spawning_abilities[mon.ability]):
-                self.change_weather(weather_spawning_abilities[mon.ability])
-        if mon.has_ability(*list(terrain_spawning_abilities)):
-            self.change_terrain(terrain_spawning_abilities[mon.ability])
+        if handler := mon.handlers.get("send_out"):
+            handler(self, mon)
 
     def are_adjacent(self, pos1: int | FieldMon, pos2: int | FieldMon) -> bool:
         if isinstance(pos1, FieldMon):
@@ -202,35 +442,35 @@ class Battle:
         if attacker.status_condition == freeze:
             if move["thaws_user"] or (random.random() < 0.2):  # note to self: prevent thawing if Burn Up would fail
                 self.apply_status(attacker, None)
-                self.output(f"{self.name(attacker)} thawed out!")
+                self.event("thawed", attacker.team_id, attacker.id)
             else:
-                self.output(f"{self.name(attacker)} is frozen solid!")
+                self.event("frozen", attacker.team_id, attacker.id)
                 return False
         elif attacker.status_condition == paralysis:
             if random.random() < 0.25:
-                self.output(f"{self.name(attacker)} is paralyzed! It can't move!")
+                self.event("fully_paralyzed", attacker.team_id, attacker.id)
                 return False
         elif attacker.status_condition == sleep:
             if attacker.status_timer == 0:
-                self.output(f"{self.name(attacker)} woke up!")
+                self.event("woke_up", attacker.team_id, attacker.id)
                 self.apply_status(attacker, None)
             else:
-                self.output(f"{self.name(attacker)} is fast asleep.")
+                self.event("asleep", attacker.team_id, attacker.id)
                 attacker.status_timer -= 1
                 return False
 
         if attacker["flinching"]:
-            self.output(f"{self.name(attacker)} flinched!")
+            self.event("flinched", attacker.team_id, attacker.id)
             return False
 
         if attacker["confused"]:
             attacker["confusion_timer"] -= 1
             if attacker["confusion_timer"] == 0:
-                self.output(f"{self.name(attacker)} snapped out of its confusion!")
+                self.event("confusion_ended", attacker.team_id, attacker.id)
                 attacker.clear("confused")
                 attacker.clear("confusion_timer")
             else:
-                self.output(f"{self.name(attacker)} is confused!")
+                self.event("confused", attacker.team_id, attacker.id)
                 if random.random() < 1/3:
                     self.output("It hurt itself in its confusion!")
                     damage = self.field.damage_roll(attacker, attacker, confusion_self_attack, allow_crit=False)
@@ -253,16 +493,16 @@ class Battle:
             return self.output("But it failed!")
 
         if defender["protecting"]:
-            return self.output(f"{self.name(defender)} protected itself!")
+            return self.event("protected", defender.team_id, defender.id)
         if self.field.move_effectiveness(attacker, defender, move) == 0 and move.category != status:
-            return self.output(f"It doesn't affect {self.name(defender, False)}...")
+            return self.event("immune", defender.team_id, defender.id)
         if self.field.terrain == psychic_terrain and move.priority > 0 and self.field.is_grounded(defender):
-            return self.output(f"{self.name(defender)} is protected by Psychic Terrain!")
+            return self.event("psychic_terrain", defender.team_id, defender.id)
         if not self.accuracy_check(attacker, defender, move):
             if len(attacker.targets) > 1:
-                return self.output(f"{self.name(defender)} avoided the attack!")
+                return self.event("avoided", defender.team_id, defender.id)
             else:
-                return self.output(f"{self.name(attacker)}'s attack missed!")
+                return self.event("missed", attacker.team_id, attacker.id)
 
         if move.category == status and len(attacker.targets) == 1:
             if move.total_key_effects == 1:  # moves that have exactly one job
@@ -306,87 +546,61 @@ class Battle:
 
     def apply_stat_change(self, mon: FieldMon, stat_change: StatChange | dict):
         changes = mon.apply(stat_change)
+        if "Spe" in changes:
+            self.reschedule(mon)
         self.display_stat_change(mon, changes)
 
     def display_stat_change(self, mon: FieldMon, stat_change: dict[str, int]):
         for stat, change in stat_change.items():
-            self.output(f"{self.name(mon)}'s {stat_names[stat]} {stat_change_texts[change]}!")
+            self.event("stat_change", mon.team_id, mon.id, stat, change)
 
     def apply_status(self, mon: FieldMon, condition: str | None):
         mon.status_condition = condition
+        self.reschedule(mon)
         if condition == sleep:
             mon.status_timer = random.choice([1, 2, 3])
         else:
             mon.status_timer = 0
         if condition:
-            self.output(f"{self.name(mon)} {status_condition_texts[condition]}!")
+            self.event("status", mon.team_id, mon.id, condition)
 
     def change_weather(self, weather: str | None, turns: int = 5):
         if weather:
             self.field.set_weather(weather, turns)
-            self.output(weather_texts[weather][0])
+            self.event("weather", weather, 0)
         elif self.field.weather is not None:
-            self.output(weather_texts[self.field.weather][2])
+            self.event("weather", self.field.weather, 2)
             self.field.set_weather(None)
+        self.reschedule()
 
     def change_terrain(self, terrain: str | None, turns: int = 5):
         if terrain:
             self.field.set_terrain(terrain, turns)
-            self.output(terrain_texts[terrain])
+            self.event("terrain", terrain, False)
         elif self.field.terrain is not None:
-            self.output(f"The {self.field.terrain} terrain dissipated.")
+            self.event("terrain", self.field.terrain, True)
             self.field.set_terrain(None)
+        self.reschedule()
 
     def pre_hit_effects(self, attacker: FieldMon, defender: FieldMon, move: Move):
         if move["removes_screens"]:
             if self.field.side(defender).reflect:
                 self.field.side(defender).set_reflect(False)
-                self.output(f"{self.possessive(defender, True)} team's Reflect was removed!")
+                self.event("screen_removed", defender.team_id, "Reflect")
             if self.field.side(defender).light_screen:
                 self.field.side(defender).set_light_screen(False)
-                self.output(f"{self.possessive(defender, True)} team's Light Screen was removed!")
+                self.event("screen_removed", defender.team_id, "Light Screen")
             if self.field.side(defender).aurora_veil:
                 self.field.side(defender).set_aurora_veil(False)
-                self.output(f"{self.possessive(defender, True)} team's Aurora Veil was removed!")
+                self.event("screen_removed", defender.team_id, "Aurora Veil")
 
     def move_effects(self, attacker: FieldMon, defender: FieldMon, move: Move):
         if defender.status_condition == freeze and move.thaws_target:
             self.apply_status(defender, None)
-            self.output(f"{self.name(defender)} was thawed out!")
-
-        if move.contact:
-            if defender.has_ability("Aftermath") and defender.fainted:
-                self.announce_ability(defender)
-                self.damage(attacker, ceil(attacker.hp / 4))
-            if defender.has_ability("Effect Spore") and (r := random.random()) < 0.3:
-                if not (grass in attacker.types):
-                    if r < 0.1 and self.field.can_apply_status(defender, attacker, mild_poison):
-                        self.announce_ability(defender)
-                        self.apply_status(attacker, mild_poison)
-                    elif 0.1 <= r < 0.2 and self.field.can_apply_status(defender, attacker, paralysis):
-                        self.announce_ability(defender)
-                        self.apply_status(attacker, paralysis)
-                    elif 0.2 <= r and self.field.can_apply_status(defender, attacker, sleep):
-                        self.announce_ability(defender)
-                        self.apply_status(attacker, sleep)
-            if defender.has_ability("Flame Body") and random.random() < 0.3:
-                if self.field.can_apply_status(defender, attacker, burn):
-                    self.announce_ability(defender)
-                    self.apply_status(attacker, burn)
-            if defender.has_ability("Gooey", "Tangling Hair"):
-                self.announce_ability(defender)
-                self.apply_stat_change(attacker, {"Spe": -1})
-            if defender.has_ability("Iron Barbs", "Rough Skin"):
-                self.announce_ability(defender)
-                self.damage(attacker, ceil(attacker.hp / 8))
-            if defender.has_ability("Poison Point") and random.random() < 0.3:
-                if self.field.can_apply_status(defender, attacker, mild_poison):
-                    self.announce_ability(defender)
-                    self.apply_status(attacker, mild_poison)
-            if defender.has_ability("Static") and random.random() < 0.3:
-                if self.field.can_apply_status(defender, attacker, paralysis):
-                    self.announce_ability(defender)
-                    self.apply_status(attacker, paralysis)
+            self.event("thawed_by_move", defender.team_id, defender.id)
+
+        if move.contact and (handler := defender.handlers.get("contact")):
+            handler(self, defender, attacker, move)
 
         if move.user_stat_changes:
             if random.random() < move.user_stat_changes.chance / 100:
@@ -407,21 +621,21 @@ class Battle:
 
         if move["reflect"] and not self.field.side(attacker).reflect:
             self.field.side(attacker).set_reflect()
-            self.output(f"Reflect protected {self.possessive(attacker)} team against physical moves!")
+            self.event("screen_set", attacker.team_id, "Reflect")
 
         if move["light_screen"] and not self.field.side(attacker).light_screen:
             self.field.side(attacker).set_light_screen()
-            self.output(f"Light Screen protected {self.possessive(attacker)} team against special moves!")
+            self.event("screen_set", attacker.team_id, "Light Screen")
 
         if move["aurora_veil"] and not self.field.side(attacker).aurora_veil:
             self.field.side(attacker).set_aurora_veil()
-            self.output(f"Aurora Veil protected {self.possessive(attacker)} team against physical and special moves!")
+            self.event("screen_set", attacker.team_id, "Aurora Veil")
 
         if move["confuse"] and self.field.can_confuse(defender):
             if random.random() < move["confuse"] / 100:
                 defender["confused"] = True
                 defender["confusion_timer"] = random.choice([2, 3, 4])
-                self.output(f"{self.name(defender)} became confused!")
+                self.event("became_confused", defender.team_id, defender.id)
 
         if move["flinch"]:
             if random.random() < move["flinch"] / 100:
@@ -431,24 +645,26 @@ class Battle:
             if random.random() < 1 / (3 ** attacker.get("successive_uses", 0)):
                 attacker["protecting"] = True
                 attacker["successive_uses"] = attacker.get("successive_uses", 0) + 1
-                self.output(f"{self.name(attacker)} protected itself!")
+                self.event("protected", attacker.team_id, attacker.id)
             else:
                 attacker.clear("successive_uses")
                 self.output("But it failed!")
 
         if move["after_you"]:
             defender["moving_next"] = True
-            self.output(f"{self.name(defender)} took the kind offer!")
+            self.reschedule(defender)
+            self.event("after_you", defender.team_id, defender.id)
 
         if move["trick_room"]:
             self.field.toggle_trick_room()
+            self.reschedule()
             if self.field.trick_room:
-                self.output(f"{self.name(attacker)} twisted the dimensions!")
+                self.event("trick_room", attacker.team_id, attacker.id)
             else:
                 self.output("The twisted dimensions returned to normal.")
 
         if move["absorbent"]:
-            self.output(f"{self.name(defender)} had its energy drained!")
+            self.event("drained", defender.team_id, defender.id)
             self.heal(attacker, ceil(defender.get("last_damage_taken", 0) * 0.5))
 
     def use_move(self, attacker: FieldMon, defender: FieldMon, move: Move):
@@ -461,11 +677,11 @@ class Battle:
             return
 
         if not attacker.has_executed_move:
-            self.output(f"{self.name(attacker)} used {move.name}!")
+            self.event("move", attacker.team_id, attacker.id, move.name)
             move.deduct_pp()
             attacker.has_executed_move = True
 
-        move = self.field.apply_conditionals(attacker, move)
+        move = self.field.apply_conditionals(attacker, move, fresh=True)  # move_modifications() sets its power
 
         if not self.but_it_failed(attacker, defender, move):
             attacker.failed_last_attack = True
@@ -495,21 +711,13 @@ class Battle:
                 damage = self.field.damage_roll(attacker, defender, move)
 
                 if damage.get("crit"):
-                    self.output(
-                        f"A critical hit on {self.name(defender, False)}!"
-                        if len(attacker.targets) > 1 else "A critical hit!"
-                    )
+                    self.event("crit", defender.team_id, defender.id, len(attacker.targets) > 1)
 
                 if n == 0:
-                    if damage.get("effectiveness", 1) > 1:
-                        self.output(
-                            f"It's super effective on {self.name(defender, False)}!"
-                            if len(attacker.targets) > 1 else "It's super effective!"
-                        )
-                    elif damage.get("effectiveness", 1) < 1:
-                        self.output(
-                            f"It's not very effective on {self.name(defender, False)}..."
-                            if len(attacker.targets) > 1 else "It's not very effective..."
+                    if damage.get("effectiveness", 1) != 1:
+                        self.event(
+                            "effectiveness", defender.team_id, defender.id, len(attacker.targets) > 1,
+                            damage["effectiveness"] > 1
                         )
 
                 self.damage(defender, damage["damage"])
@@ -555,6 +763,9 @@ class Battle:
             if self.field.terrain == grassy_terrain and self.field.is_grounded(mon):
                 self.heal(mon, ceil(mon.hp / 16), "HP from Grassy Terrain")
 
+            if handler := mon.handlers.get("end_of_turn"):
+                handler(self, mon)
+
             self.team(mon).update_mon(mon)
 
     def send_out_replacements(self):
@@ -564,8 +775,19 @@ class Battle:
                     self.deploy_mon(mon.team_id, self.team(mon).get_replacement(mon.position), mon.position)
                 else:
                     self.field.deploy_mon(None, mon.position)
+                    mon.position = -1
+
+    async def send_out_replacements_async(self):
+        for mon in self.fielded_mons:
+            if mon.fainted:
+                if self.team(mon).reserves:
+                    replacement = await self.team(mon).get_replacement_async(mon.position)
+                    self.deploy_mon(mon.team_id, replacement, mon.position)
+                else:
+                    self.field.deploy_mon(None, mon.position)
+                    mon.position = -1
 
-    def end_of_turn(self):
+    def end_of_turn(self, send_out: bool = True):
         for mon in self.fielded_mons:
             self.individual_end_of_turn(mon)
         if self.check_winner() is not None:
@@ -576,17 +798,17 @@ class Battle:
                 side.reflect_timer -= 1
                 if side.reflect_timer == 0:
                     side.set_reflect(False)
-                    self.output(("Your team's" if n == self.pov else "Opponent's") + " Reflect wore off!")
+                    self.event("screen_ended", n, "Reflect")
             if side.light_screen and side.light_screen_timer > 0:
                 side.light_screen_timer -= 1
                 if side.light_screen_timer == 0:
                     side.set_light_screen(False)
-                    self.output(("Your team's" if n == self.pov else "Opponent's") + " Light Screen wore off!")
+                    self.event("screen_ended", n, "Light Screen")
             if side.aurora_veil and side.aurora_veil_timer > 0:
                 side.aurora_veil_timer -= 1
                 if side.aurora_veil_timer == 0:
                     side.set_aurora_veil(False)
-                    self.output(("Your team's" if n == self.pov else "Opponent's") + " Aurora Veil wore off!")
+                    self.event("screen_ended", n, "Aurora Veil")
 
         if self.last_output:
             self.output("", 0)
@@ -595,7 +817,7 @@ class Battle:
             if self.field.weather_timer == 0:
                 self.change_weather(None)
             else:
-                self.output(weather_texts[self.field.weather][1])
+                self.event("weather", self.field.weather, 1)
         if self.field.terrain is not None and self.field.terrain_timer > 0:
             self.field.terrain_timer -= 1
             if self.field.terrain_timer == 0:
@@ -608,61 +830,112 @@ class Battle:
 
         if self.last_output:
             self.output("", 0)
-        self.send_out_replacements()
+        if send_out:
+            self.send_out_replacements()
 
     def check_fainted(self, mon: FieldMon):
         if mon.remaining_hp == 0 and not mon.fainted:
             mon.fainted = True
-            self.output(f"{self.name(mon)} fainted!")
+            self.remaining[mon.team_id] -= 1
+            self.field.update_abilities()
+            self.event("faint", mon.team_id, mon.id)
             self.team(mon).recall_mon(mon)
 
+    def count_remaining(self):
+        """Recounts the non-fainted mons on each team, for after a roster is changed other than by check_fainted()."""
+        self.remaining = [sum(not g.fainted for g in t.mons.values()) for t in self.teams]
+
     def check_winner(self) -> int | None:
-        for n, t in enumerate(self.teams):
-            if all(g.get("fainted") for g in t.mons.values()):
+        for n, count in enumerate(self.remaining):
+            if not count:
                 return int(not n)
 
     def output_winner(self):
         if (winner := self.check_winner()) is not None:
-            return self.output(self.spaced(f"{self.team(winner).trainer} wins!"), 0)
+            return self.event("win", winner, bool(self.last_output), sleep_time=0)
 
     def special_actions(self, mon: FieldMon):
         mon.has_taken_turn = True
         if mon.next_action == "!unplugged":
-            self.output(f"{self.name(mon)}'s Controller is unplugged. Try using a Player or BasicAI object.")
+            self.event("unplugged", mon.team_id, mon.id)
         if mon.next_action == "!switch":
             self.deploy_mon(mon.team_id, mon.targets[0], mon.position)
 
-    def run(self):
+    def run(self, max_turns: int = None):
         self.init_battle()
+        while max_turns is None or self.turn_count < max_turns:
+            if self.play_turn():
+                break
+        if self.log is not None:
+            self.log.finish()
+
+    def play_turn(self) -> bool:
+        """Plays out a single turn, from choosing actions through end-of-turn effects. Returns whether someone won."""
+        self.start_turn()
+        for team in self.teams:
+            team.set_actions()
+        return self.resolve_turn()
+
+    async def run_async(self, max_turns: int = None):
+        """The same as run(), but awaits the controllers; use a sink that doesn't sleep."""
+        self.init_battle()
+        while max_turns is None or self.turn_count < max_turns:
+            if await self.play_turn_async():
+                break
+        if self.log is not None:
+            self.log.finish()
+
+    async def play_turn_async(self) -> bool:
+        """play_turn() for run_async(). Both sides choose their actions at the same time."""
+        import asyncio  # only async battles need it, and it takes longer to import than everything else here
+        self.start_turn()
+        await asyncio.gather(*(g.set_actions_async() for g in self.teams))
+        if self.resolve_turn(send_out=False):
+            return True
+        await self.send_out_replacements_async()
+        return False
 
-        while True:
-            self.turn_count += 1
-            for mon in self.fielded_mons:
-                mon.turn_on_field += 1
-            self.output(self.spaced(
-                f"[ TURN {self.turn_count} ]\n\n" +
-                (f"{self.field.summary()}\n\n" if self.field.summary() else "") +
+    def start_turn(self):
+        self.turn_count += 1
+        for mon in self.fielded_mons:
+            mon.turn_on_field += 1
+        if self.headless:  # don't bother building the diagram if nobody's going to look at it
+            self.event("turn", self.turn_count, bool(self.last_output), "")
+        else:
+            summary = self.field.summary()
+            self.event("turn", self.turn_count, bool(self.last_output), (
+                "\n" +
+                (f"{summary}\n\n" if summary else "") +
                 f"{self.field.diagram(from_side=self.pov)}\n"
             ))
 
-            for team in self.teams:
-                team.set_actions()
-
-            while mon := self.next_to_move():  # dynamic turn order - iterate over each mon once
-                mon.clear("moving_next")
-                if mon.next_action.startswith("!"):
-                    self.special_actions(mon)
+    def resolve_turn(self, send_out: bool = True) -> bool:
+        """Carries out this turn's actions and end-of-turn effects, sending out replacements if send_out."""
+        self.queue_turn()
+        while mon := self.next_to_move():  # dynamic turn order - iterate over each mon once
+            mon.clear("moving_next")
+            if not mon.next_action:  # mons switched in partway through the turn don't get to act
+                mon.has_taken_turn = True
+                continue
+            if mon.next_action.startswith("!"):
+                self.special_actions(mon)
+            else:
+                self.double_check_targets(mon)
+                if not mon.targets:
+                    self.event("no_targets", mon.team_id, mon.id, mon.move_selection.name)
+                    mon.has_taken_turn = True
                 else:
-                    self.double_check_targets(mon)
-                    if not mon.targets:
-                        self.output(f"{self.name(mon)} has no valid targets for {mon.move_selection.name}!")
-                    else:
-                        for target in mon.targets:
-                            self.use_move(mon, self.at(target), mon.moves[mon.next_action])
-                            if self.check_winner() is not None:
-                                return self.output_winner()
-                self.output("", 0)
-
-            self.end_of_turn()
-            if self.check_winner() is not None:
-                return self.output_winner()
+                    for target in mon.targets:
+                        self.use_move(mon, self.at(target), mon.moves[mon.next_action])
+                        if self.check_winner() is not None:
+                            self.queue = None
+                            self.output_winner()
+                            return True
+            self.output("", 0)
+        self.queue = None
+
+        self.end_of_turn(send_out)
+        if self.check_winner() is not None:
+            self.output_winner()
+            return True
+        return False
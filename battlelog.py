@@ -0,0 +1,280 @@
+from battle import *
+from collections.abc import Iterator
+from typing import BinaryIO
+import bz2
+import gzip
+import lzma
+
+
+log_version = 2
+# The arguments of each event in event_texts: "i" unsigned int, "z" signed int, "b" bool, and "s" string, which is
+# written out the first time it comes up in a battle and by index after that. Codes are positions in this dict, so new
+# events go at the end of the first part, and new mon_texts at the end of that.
+event_schemas = {
+    "text": "s", "turn": "ibs", "recall": "ii", "send_out": "ii", "move": "iis", "damage": "iiisi", "heal": "iiisi",
+    "crit": "iib", "ability": "iis", "stat_change": "iisz", "status": "iis", "weather": "si", "terrain": "sb",
+    "faint": "ii", "win": "ib", "effectiveness": "iibb", "screen_set": "is", "screen_removed": "is",
+    "screen_ended": "is", "ruin": "iis", "no_targets": "iis"
+} | {g: "ii" for g in mon_texts}
+event_names = tuple(event_schemas)
+event_codes = {g: n for n, g in enumerate(event_names)}
+compressors = {"gzip": gzip.open, "bz2": bz2.open, "lzma": lzma.open, None: open}
+magic_numbers = {b"\x1f\x8b": gzip.open, b"BZh": bz2.open, b"\xfd7zXZ\x00": lzma.open}
+# Starting teams are written as indices into these, so a log can only be read with the data files it was written with
+logged_species = tuple(all_species)
+logged_moves = tuple(all_moves)
+logged_items = (None, *all_items)
+species_codes = {g: n for n, g in enumerate(logged_species)}
+move_codes = {g: n for n, g in enumerate(logged_moves)}
+item_codes = {g: n for n, g in enumerate(logged_items)}
+nature_codes = {g: n for n, g in enumerate(nature_table)}
+type_codes = {g: n for n, g in enumerate(types)}
+
+
+def write_varint(buffer: bytearray, n: int):
+    while n > 0x7f:
+        buffer.append(n & 0x7f | 0x80)
+        n >>= 7
+    buffer.append(n)
+
+
+def read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    """The varint at pos, and the position after it."""
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def read_stream_varint(file: BinaryIO) -> int | None:
+    """The next varint in a file, or None at the end of the file."""
+    n = shift = 0
+    while byte := file.read(1):
+        n |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return n
+        shift += 7
+    return None
+
+
+def read_string(data: bytes, pos: int, strings: list[str]) -> tuple[str, int]:
+    index, pos = read_varint(data, pos)
+    if index == len(strings):
+        length, pos = read_varint(data, pos)
+        strings.append(data[pos:pos + length].decode("utf-8"))
+        pos += length
+    return strings[index], pos
+
+
+def read_team(data: bytes, pos: int, strings: list[str]) -> tuple[dict, int]:
+    """The team at pos, as a Team.from_json()-compatible dict, and the position after it."""
+    trainer, pos = read_string(data, pos, strings)
+    size, pos = read_varint(data, pos)
+    count, pos = read_varint(data, pos)
+    mons = []
+    for _ in range(count):
+        mon = {}
+        code, pos = read_varint(data, pos)
+        mon["species"] = logged_species[code]
+        code, pos = read_varint(data, pos)
+        mon["form"] = list(all_species[mon["species"]].forms)[code]
+        mon["level"], pos = read_varint(data, pos)
+        mon["gender"], pos = read_string(data, pos, strings)
+        code, pos = read_varint(data, pos)
+        mon["nature"] = nature_table[code]
+        mon["ivs"], mon["evs"] = list(data[pos:pos + 6]), list(data[pos + 6:pos + 12])
+        pos += 12
+        mon["ability"], pos = read_string(data, pos, strings)
+        code, pos = read_varint(data, pos)
+        mon["held_item"] = logged_items[code]
+        code, pos = read_varint(data, pos)
+        mon["tera_type"] = types[code]
+        mon["move_names"] = []
+        move_count, pos = read_varint(data, pos)
+        for _ in range(move_count):
+            code, pos = read_varint(data, pos)
+            mon["move_names"].append(logged_moves[code])
+        nickname, pos = read_string(data, pos, strings)
+        mons.append(mon | ({"nickname": nickname} if nickname else {}))
+    return {"trainer": trainer, "mons": mons} | ({"size": size} if size != 6 else {}), pos
+
+
+def team_pack(team: Team) -> dict:
+    """A Team.from_json()-compatible dict of a team's mons, in id order."""
+    return {"trainer": team.trainer, "mons": [team.mons[g].mini_pack() for g in sorted(team.mons)]} | \
+        ({"size": team._size} if team._size != 6 else {})
+
+
+class BattleLogWriter:
+    """Records battles as compact binary logs, for a Battle's log. Each battle is a varint-prefixed record holding the
+    battle's size, pov and starting teams, then each event as a varint code followed by its arguments (see
+    event_schemas). A battle is kept in memory until it finishes, then appended to the file in one write, so a file can
+    hold any number of battles and can be added to later. A path is opened for appending with the given compression
+    (gzip, bz2, lzma or None), and an open binary file is written to as is."""
+
+    def __init__(self, file: str | BinaryIO, compression: str | None = "gzip"):
+        self.owns_file = isinstance(file, str)
+        self.file = compressors[compression](file, "ab") if self.owns_file else file
+        self.buffer = None
+        self.strings = {}
+        self.battles = 0
+
+    def write_string(self, s: str):
+        if (index := self.strings.get(s)) is not None:
+            write_varint(self.buffer, index)
+        else:
+            write_varint(self.buffer, len(self.strings))
+            self.strings[s] = len(self.strings)
+            data = s.encode("utf-8")
+            write_varint(self.buffer, len(data))
+            self.buffer += data
+
+    def write_team(self, team: Team):
+        self.write_string(team.trainer)
+        write_varint(self.buffer, team._size)
+        write_varint(self.buffer, len(team.mons))
+        for mon in (team.mons[g] for g in sorted(team.mons)):
+            write_varint(self.buffer, species_codes[mon.species.name])
+            write_varint(self.buffer, list(mon.species.forms).index(mon.form.name))
+            write_varint(self.buffer, mon.level)
+            self.write_string(mon.gender)
+            write_varint(self.buffer, nature_codes[mon.nature])
+            self.buffer += bytes(mon.ivs) + bytes(mon.evs)
+            self.write_string(mon.ability)
+            write_varint(self.buffer, item_codes[mon.held_item.name if mon.held_item else None])
+            write_varint(self.buffer, type_codes[mon.tera_type])
+            write_varint(self.buffer, len(mon.move_names))
+            for move in mon.move_names:
+                write_varint(self.buffer, move_codes[move])
+            self.write_string(mon.nickname or "")
+
+    def begin(self, battle: Battle):
+        self.buffer = bytearray()
+        self.strings = {}
+        for n in (log_version, battle.size, battle.pov):
+            write_varint(self.buffer, n)
+        for team in battle.teams:
+            self.write_team(team)
+
+    def event(self, name: str, args: tuple):
+        if self.buffer is None:  # output from outside a battle's run, e.g. before begin()
+            return
+        write_varint(self.buffer, event_codes[name])
+        for kind, arg in zip(event_schemas[name], args):
+            if kind == "s":
+                self.write_string(arg)
+            elif kind == "z":
+                write_varint(self.buffer, arg * 2 if arg >= 0 else -arg * 2 - 1)
+            else:
+                write_varint(self.buffer, int(arg))
+
+    def finish(self):
+        if self.buffer is not None:
+            header = bytearray()
+            write_varint(header, len(self.buffer))
+            self.file.write(header + self.buffer)
+            self.buffer = None
+            self.battles += 1
+
+    def close(self):
+        self.finish()
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class LoggedBattle:
+    """A battle read back from a log: its teams as they were at the start, and its events in order. lines() renders the
+    same text the battle output, from the same point of view."""
+    name = Battle.name
+    possessive = Battle.possessive
+
+    def __init__(self, size: int, pov: int, team_packs: list[dict], events: list[tuple[str, tuple]]):
+        self.size = size
+        self.pov = pov
+        self.team_packs = team_packs
+        self.events = events
+        self._teams = None
+
+    @property
+    def teams(self) -> list[Team]:
+        if self._teams is None:  # only built when needed, since most reads don't render anything
+            self._teams = []
+            for n, pack in enumerate(self.team_packs):
+                team = Team.from_json(pack)
+                team.change_id(n)
+                self._teams.append(team)
+        return self._teams
+
+    def team(self, side: int) -> Team:
+        return self.teams[side]
+
+    @property
+    def winner(self) -> int | None:
+        return next((args[0] for name, args in reversed(self.events) if name == "win"), None)
+
+    @property
+    def turn_count(self) -> int:
+        return next((args[0] for name, args in reversed(self.events) if name == "turn"), 0)
+
+    def lines(self) -> Iterator[str]:
+        for name, args in self.events:
+            yield event_texts[name](self, *args)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines())
+
+    @staticmethod
+    def from_record(record: bytes):
+        strings = []
+        version, pos = read_varint(record, 0)
+        if version != log_version:
+            raise ValueError(f"Unsupported battle log version: {version}")
+        size, pos = read_varint(record, pos)
+        pov, pos = read_varint(record, pos)
+        team_packs = []
+        for _ in range(2):
+            pack, pos = read_team(record, pos, strings)
+            team_packs.append(pack)
+
+        events = []
+        while pos < len(record):
+            code, pos = read_varint(record, pos)
+            name = event_names[code]
+            args = []
+            for kind in event_schemas[name]:
+                if kind == "s":
+                    arg, pos = read_string(record, pos, strings)
+                else:
+                    arg, pos = read_varint(record, pos)
+                    if kind == "z":
+                        arg = -(arg + 1 >> 1) if arg & 1 else arg >> 1
+                    elif kind == "b":
+                        arg = bool(arg)
+                args.append(arg)
+            events.append((name, tuple(args)))
+        return LoggedBattle(size, pov, team_packs, events)
+
+
+def read_battle_logs(file: str | BinaryIO) -> Iterator[LoggedBattle]:
+    """Streams the battles in a log, one record at a time. A path's compression is detected from its first bytes; an
+    open file is read as is. A record cut short (e.g. by a crash partway through writing it) ends the log."""
+    owns_file = isinstance(file, str)
+    if owns_file:
+        with open(file, "rb") as f:
+            magic = f.read(6)
+        file = next((v for k, v in magic_numbers.items() if magic.startswith(k)), open)(file, "rb")
+    try:
+        while (length := read_stream_varint(file)) is not None:
+            if len(record := file.read(length)) < length:
+                return
+            yield LoggedBattle.from_record(record)
+    finally:
+        if owns_file:
+            file.close()
@@ -0,0 +1,159 @@
+from montecarlo import *
+from pokepaste import *
+import argparse
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+
+
+benchmark_teams = [
+    [
+        MiniMon("Garchomp", nature="Jolly", evs=[0, 252, 0, 0, 4, 252], ability="Rough Skin",
+                move_names=["Earthquake", "Dragon Claw", "Swords Dance", "Fire Fang"]),
+        MiniMon("Politoed", nature="Bold", evs=[252, 0, 252, 0, 4, 0], ability="Drizzle",
+                move_names=["Surf", "Ice Beam", "Hypnosis", "Protect"]),
+        MiniMon("Pikachu", nature="Timid", evs=[0, 0, 0, 252, 4, 252], ability="Static",
+                move_names=["Thunderbolt", "Quick Attack", "Thunder Wave", "Grass Knot"]),
+        MiniMon("Gengar", nature="Timid", evs=[0, 0, 0, 252, 4, 252], ability="Cursed Body",
+                move_names=["Shadow Ball", "Sludge Bomb", "Will-O-Wisp", "Protect"]),
+        MiniMon("Tyranitar", nature="Adamant", evs=[252, 252, 0, 0, 4, 0], ability="Sand Stream",
+                move_names=["Crunch", "Stone Edge", "Dragon Dance", "Earthquake"]),
+        MiniMon("Tapu Lele", nature="Modest", evs=[0, 0, 0, 252, 4, 252], ability="Psychic Surge",
+                move_names=["Psychic", "Moonblast", "Calm Mind", "Focus Blast"])
+    ],
+    [
+        MiniMon("Dragonite", nature="Adamant", evs=[252, 252, 0, 0, 4, 0], ability="Inner Focus",
+                move_names=["Extreme Speed", "Dragon Claw", "Dragon Dance", "Fire Punch"]),
+        MiniMon("Torkoal", nature="Quiet", evs=[252, 0, 0, 252, 4, 0], ability="Drought",
+                move_names=["Eruption", "Heat Wave", "Earth Power", "Protect"]),
+        MiniMon("Gyarados", nature="Jolly", evs=[0, 252, 0, 0, 4, 252], ability="Intimidate",
+                move_names=["Waterfall", "Ice Fang", "Dragon Dance", "Thunder Wave"]),
+        MiniMon("Scizor", nature="Adamant", evs=[252, 252, 0, 0, 4, 0], ability="Technician",
+                move_names=["Bullet Punch", "U-turn", "Swords Dance", "Protect"]),
+        MiniMon("Amoonguss", nature="Calm", evs=[252, 0, 4, 0, 252, 0], ability="Effect Spore",
+                move_names=["Spore", "Giga Drain", "Sludge Bomb", "Protect"]),
+        MiniMon("Ferrothorn", nature="Relaxed", evs=[252, 0, 252, 0, 4, 0], ability="Iron Barbs",
+                move_names=["Power Whip", "Gyro Ball", "Leech Seed", "Protect"])
+    ]
+]
+
+
+def time_calls(func, repeats: int = 5) -> dict[str, float | int]:
+    """Times a no-argument callable with timeit, picking the loop count automatically. Times are per call, in
+    microseconds; the best of the repeats is the least noisy number to compare."""
+    timer = timeit.Timer(func)
+    loops = timer.autorange()[0]
+    runs = [g / loops * 1e6 for g in timer.repeat(repeats, loops)]
+    return {"best_us": min(runs), "median_us": statistics.median(runs), "loops": loops, "repeats": repeats}
+
+
+def time_import(module: str, repeats: int = 5) -> dict[str, float | int]:
+    """Times importing a module in a fresh interpreter, in milliseconds, with the data cache already built."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    runs = []
+    for _ in range(repeats + 1):  # the first run may have to build the cache, so it isn't counted
+        out = subprocess.run(
+            [sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        )
+        runs.append(float(out.stdout) * 1e3)
+    return {"best_ms": min(runs[1:]), "median_ms": statistics.median(runs[1:]), "repeats": repeats}
+
+
+def benchmark_battle(size: int = 1) -> Battle:
+    """A battle between the benchmark teams with the leads sent out, for the micro-benchmarks to work on."""
+    random.seed(0)
+    battle = Battle(
+        [BasicAI(team, trainer=f"Team {n + 1}") for n, team in enumerate(benchmark_teams)],
+        size, sink=NullSink()
+    )
+    battle.init_battle()
+    return battle
+
+
+def micro_benchmarks(repeats: int = 5) -> dict[str, dict]:
+    battle = benchmark_battle()
+    attacker, defender = battle.at(0), battle.at(1)
+    move = attacker.moves["Earthquake"]
+    paste = benchmark_teams[0][0].pokepaste()
+    uncached_fix = fix.__wrapped__
+
+    def damage_roll():
+        battle.field.damage_roll(attacker, defender, move)
+
+    random.seed(0)
+    return {
+        "Field.damage_roll": time_calls(damage_roll, repeats),
+        "Field.get_stat": time_calls(lambda: battle.field.get_stat(attacker, "Spe"), repeats),
+        "FieldMon.type_effectiveness": time_calls(lambda: defender.type_effectiveness(ground), repeats),
+        "Move.from_pack": time_calls(lambda: Move.from_pack("Earthquake", 10), repeats),
+        "MiniMon.from_pokepaste": time_calls(lambda: MiniMon.from_pokepaste(paste), repeats),
+        "fix": time_calls(lambda: fix("Tapu Lele"), repeats),
+        "fix (uncached)": time_calls(lambda: uncached_fix("Tapu Lele"), repeats),
+        "import mons": time_import("mons", repeats)
+    }
+
+
+def battle_benchmark(size: int, battles: int = 50, seed: int = 0, max_turns: int = 200) -> dict[str, float | int]:
+    """Plays the benchmark teams against each other headlessly with BasicAI, one seed per battle, in this process."""
+    specs = [team_spec(g, f"Team {n + 1}") for n, g in enumerate(benchmark_teams)]
+    turns = 0
+    start = time.perf_counter()
+    for n in range(battles):
+        turns += run_battle(*specs, size, seed + n, max_turns).turn_count
+    elapsed = time.perf_counter() - start
+    return {
+        "battles": battles, "turns": turns, "seconds": elapsed,
+        "battles_per_second": battles / elapsed, "turns_per_second": turns / elapsed
+    }
+
+
+def macro_benchmarks(battles: int = 50, seed: int = 0) -> dict[str, dict]:
+    return {
+        name: battle_benchmark(size, battles, seed)
+        for size, name in ((1, "singles"), (2, "doubles"), (3, "triples"))
+    }
+
+
+def run_benchmarks(repeats: int = 5, battles: int = 50, seed: int = 0) -> dict[str]:
+    return {
+        "python": platform.python_version(), "implementation": platform.python_implementation(),
+        "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "micro": micro_benchmarks(repeats), "macro": macro_benchmarks(battles, seed)
+    }
+
+
+def compare(old: dict, new: dict) -> str:
+    """A summary of how each benchmark changed between two runs. Ratios above 1 mean new is faster."""
+    ret = []
+    for name, result in new["micro"].items():
+        if name in old["micro"]:
+            key = "best_us" if "best_us" in result else "best_ms"
+            ret.append(f"{name}: {old['micro'][name][key]:.3f} -> {result[key]:.3f} {key[-2:]} "
+                       f"({old['micro'][name][key] / result[key]:.2f}x)")
+    for name, result in new["macro"].items():
+        if name in old["macro"]:
+            before, after = old["macro"][name]["battles_per_second"], result["battles_per_second"]
+            ret.append(f"{name}: {before:.1f} -> {after:.1f} battles/s ({after / before:.2f}x)")
+    return "\n".join(ret)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the simulator's hot paths and writes the results as JSON.")
+    parser.add_argument("output", nargs="?", default="benchmarks.json", help="where to write the results")
+    parser.add_argument("--repeats", type=int, default=5, help="timing repeats for each micro-benchmark")
+    parser.add_argument("--battles", type=int, default=50, help="battles to play for each battle format")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first battle")
+    parser.add_argument("--compare", metavar="PATH", help="an earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.repeats, args.battles, args.seed)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(json.load(f), results))
+    else:
+        print(json.dumps(results, indent=2))
@@ -1,4 +1,7 @@
 from field import *
+from collections import OrderedDict
+from math import inf, log, sqrt
+import time
 
 
 def can_int(s: str) -> bool:
@@ -14,10 +17,14 @@ class Controller(Team):
     def __init__(self, mons: list[MiniMon] = (), **kwargs):
         super().__init__(mons, **kwargs)
         self.field = None
+        self.battle = None  # only needed by controllers that look ahead
 
     def set_field(self, field: Field):
         self.field = field
 
+    def set_battle(self, battle):
+        self.battle = battle
+
     @property
     def fielded_mons(self) -> list[FieldMon]:
         return [g for g in self.field.fielded_mons if g.team_id == self.id]
@@ -34,9 +41,351 @@ class Controller(Team):
     def get_replacement(self, position: int) -> int:
         """Gets the ID number of a replacement for a mon that fainted in the preceding turn."""
         if self.reserves:
-            return self.reserves[0]["id"]
+            return self.reserves[0].id
         return None
 
+    async def set_actions_async(self):
+        """set_actions() for Battle.run_async(); calls the synchronous version unless overridden."""
+        self.set_actions()
+
+    async def get_replacement_async(self, position: int) -> int:
+        return self.get_replacement(position)
+
+    def options(self, mon: FieldMon) -> list[tuple[str, tuple[int, ...]]]:
+        """Every (action, targets) pair available to a mon: each usable move at each foe it can target, and switches."""
+        ret = []
+        for move in mon.moves.values():
+            if not move.remaining_pp:
+                continue
+            targets = self.field.targets(mon.position, self.field.apply_conditionals(mon, move).target)
+            if move.is_single_target and len(targets) > 1:
+                foes = [g for g in targets if g // self.field.size != mon.position // self.field.size]
+                ret.extend((move.name, (g, )) for g in (foes or targets))
+            elif targets:
+                ret.append((move.name, tuple(targets)))
+        ret.extend(("!switch", (g.id, )) for g in self.reserves)
+        return ret
+
+    def joint_options(self) -> list[tuple[tuple[int, tuple[str, tuple[int, ...]]], ...]]:
+        """Every combination of options for the fielded mons, as (position, option) tuples."""
+        ret = [()]
+        for mon in self.fielded_mons:
+            if options := ([] if mon.fainted else self.options(mon)):
+                ret = [
+                    g + ((mon.position, j), ) for g in ret for j in options
+                    if j[0] != "!switch" or all(j != k for _, k in g)
+                ]
+        return ret
+
+    def apply_actions(self, joint: tuple):
+        """Sets actions from a tuple of (position, (action, targets)), as given by joint_options()."""
+        for position, (action, targets) in joint:
+            mon = self.field.at(position)
+            mon.next_action = action
+            mon.targets = list(targets)
+            if action == "!switch":
+                mon.field_status = "switching out"
+                self.mons[targets[0]].field_status = "switching in"
+
+
+def hp_balance(battle, team_id: int) -> float:
+    """Scores a battle for one side: 1 for a win, 0 for a loss, otherwise by the share of HP left."""
+    if (winner := battle.check_winner()) is not None:
+        return float(winner == team_id)
+    mine, theirs = (
+        sum(g.remaining_hp / g.hp for g in team.mons.values()) / len(team.mons)
+        for team in (battle.teams[team_id], battle.teams[1 - team_id])
+    )
+    return 0.5 + 0.5 * (mine - theirs)
+
+
+class BasicAI(Controller):
+    def __init__(self, mons: list[MiniMon] = (), **kwargs):
+        super().__init__(mons, **kwargs)
+
+    def set_actions(self):
+        for mon in self.fielded_mons:
+            self.get_action(mon)
+
+    def get_action(self, mon: FieldMon):
+        """Picks a random move with PP remaining, preferring to target opponents."""
+        usable_moves = [
+            g for g in mon.moves.values()
+            if g.remaining_pp and self.field.targets(mon.position, self.field.apply_conditionals(mon, g).target)
+        ]
+        if not usable_moves:
+            mon.next_action = "!unplugged"
+            return
+        move = random.choice(usable_moves)
+        targets = self.field.targets(mon.position, self.field.apply_conditionals(mon, move).target)
+        if move.is_single_target and len(targets) > 1:
+            foes = [g for g in targets if g // self.field.size != mon.position // self.field.size]
+            targets = [random.choice(foes or targets)]
+        mon.next_action = move.name
+        mon.targets = targets
+
+
+class MCTSNode:
+    __slots__ = ("visits", "stats", "children")
+
+    def __init__(self):
+        self.visits = 0
+        self.stats = {}  # position: {(action, targets): [visits, total value]}
+        self.children = {}  # joint action (tuple of (position, (action, targets))): MCTSNode
+
+
+class MCTS(BasicAI):
+    """Picks actions by decoupled Monte Carlo tree search, assuming opponents choose like a BasicAI."""
+    def __init__(self, mons: list[MiniMon] = (), **kwargs):
+        super().__init__(mons, **kwargs)
+        self.iterations = kwargs.get("iterations", 200)
+        self.time_limit = kwargs.get("time_limit")  # seconds
+        self.rollout_turns = kwargs.get("rollout_turns", 5)  # random turns played after leaving the tree
+        self.exploration = kwargs.get("exploration", 1.4)
+        self.root = None
+        self.root_turn = -1
+        self.last_search = {}
+
+    def set_actions(self):
+        if self.battle is None:  # e.g. a copy in someone else's simulation
+            return super().set_actions()
+
+        start = time.perf_counter()
+        if self.root is None or self.root_turn != self.battle.turn_count:
+            self.root = MCTSNode()
+        reused = self.root.visits
+        rng_state = random.getstate()  # how many draws the search makes can depend on the time limit
+        sim = self.battle.fork(BasicAI)
+        state = sim.snapshot()
+        iterations = 0
+        while iterations < self.iterations and \
+                (self.time_limit is None or time.perf_counter() - start < self.time_limit):
+            sim.restore(state)
+            self.iterate(sim)
+            iterations += 1
+        random.setstate(rng_state)
+        elapsed = time.perf_counter() - start
+        self.last_search = {
+            "iterations": iterations, "elapsed": elapsed, "reused_visits": reused,
+            "iterations_per_second": iterations / elapsed if elapsed else 0
+        }
+
+        joint = self.best_actions(self.root)
+        self.apply_actions(joint)
+        for mon in self.fielded_mons:
+            if not mon.fainted and mon.position not in dict(joint):
+                self.get_action(mon)
+        self.root = self.root.children.get(joint)
+        self.root_turn = self.battle.turn_count + 1
+
+    def select(self, node: MCTSNode, team: Team) -> tuple:
+        joint = []
+        switching_in = set()
+        for mon in team.fielded_mons:
+            if mon.fainted:
+                continue
+            options = [g for g in team.options(mon) if g[0] != "!switch" or g[1][0] not in switching_in]
+            if not options:
+                continue
+            stats = node.stats.get(mon.position, {})
+            total = log(node.visits + 1)
+            option = max(options, key=lambda g: (  # UCB1; untried options first, in random order
+                (stats[g][1] + self.exploration * sqrt(total * stats[g][0])) / stats[g][0] if g in stats else inf,
+                random.random()
+            ))
+            if option[0] == "!switch":
+                switching_in.add(option[1][0])
+            joint.append((mon.position, option))
+        return tuple(joint)
+
+    def best_actions(self, node: MCTSNode) -> tuple:
+        """The most-visited option for each fielded mon that's still available."""
+        joint = []
+        switching_in = set()
+        for mon in self.fielded_mons:
+            stats = node.stats.get(mon.position, {})
+            options = [
+                g for g in self.options(mon) if g in stats and (g[0] != "!switch" or g[1][0] not in switching_in)
+            ]
+            if mon.fainted or not options:
+                continue
+            option = max(options, key=lambda g: stats[g][0])
+            if option[0] == "!switch":
+                switching_in.add(option[1][0])
+            joint.append((mon.position, option))
+        return tuple(joint)
+
+    def iterate(self, sim):
+        node = self.root
+        path = []
+        while True:
+            joint = self.select(node, sim.teams[self.id])
+            path.append((node, joint))
+            sim.teams[self.id].apply_actions(joint)
+            sim.teams[1 - self.id].set_actions()
+            if over := sim.resolve_turn():
+                break
+            if joint not in node.children:
+                node.children[joint] = MCTSNode()
+                break
+            node = node.children[joint]
+            sim.start_turn()
+
+        for _ in range(self.rollout_turns):
+            if over:
+                break
+            over = sim.play_turn()
+
+        value = hp_balance(sim, self.id)
+        for node, joint in path:
+            node.visits += 1
+            for position, option in joint:
+                stat = node.stats.setdefault(position, {}).setdefault(option, [0, 0.0])
+                stat[0] += 1
+                stat[1] += value
+
+
+class Zobrist:
+    """Zobrist hashing, with each feature's key a seeded BLAKE2 hash rather than a stored random."""
+    def __init__(self, seed: int = 0, max_keys: int = 65536):
+        self.salt = seed.to_bytes(8, "little")
+        self.max_keys = max_keys
+        self.keys = {}
+
+    def __getitem__(self, feature: tuple) -> int:
+        try:
+            return self.keys[feature]
+        except KeyError:
+            from hashlib import blake2b  # only searches make keys, and hashlib is slow to import (it loads OpenSSL)
+            if len(self.keys) >= self.max_keys:
+                self.keys.clear()
+            self.keys[feature] = key = int.from_bytes(
+                blake2b(repr(feature).encode("utf-8"), digest_size=8, key=self.salt).digest(), "little"
+            )
+            return key
+
+    def mon_hash(self, mon: FieldMon) -> int:
+        ret = self[(
+            mon.team_id, mon.id, mon.remaining_hp, mon.status_condition, mon.status_timer, mon.position,
+            mon.field_status, mon.terastallized, mon.original_types, mon.turn_on_field
+        )] ^ self[(mon.team_id, mon.id, "stages", *mon.stat_stages.values())] ^ \
+            self[(mon.team_id, mon.id, "pp", *(g.remaining_pp for g in mon.moves.values()))]
+        if mon.other_data:
+            ret ^= self[(mon.team_id, mon.id, "data", *sorted(mon.other_data.items()))]
+        return ret
+
+    def hash(self, battle) -> int:
+        field = battle.field
+        ret = self[(
+            "field", field.weather, field.weather_timer, field.terrain, field.terrain_timer, field.trick_room,
+            field.trick_room_timer
+        )]
+        for n, side in enumerate(field.sides):
+            ret ^= self[("side", n, *side.save_state())]
+        for team in battle.teams:
+            for mon in team.mons.values():
+                ret ^= self.mon_hash(mon)
+        return ret
+
+
+class Expectiminimax(BasicAI):
+    """A deterministic, seeded alpha-beta searching AI for singles endgames, with chance nodes."""
+    exact, lower, upper = 0, 1, 2  # what a stored value is
+
+    def __init__(self, mons: list[MiniMon] = (), **kwargs):
+        super().__init__(mons, **kwargs)
+        self.depth = kwargs.get("depth", 1)  # turns
+        self.samples = kwargs.get("samples", 4)  # per chance node
+        self.table_size = kwargs.get("table_size", 100000)
+        self.table = OrderedDict()  # (hash, depth): (value, flag, best joint action)
+        self.zobrist = Zobrist()
+        self.last_search = {}
+        self.nodes = self.table_hits = 0
+
+    def set_actions(self):
+        if self.battle is None:
+            return super().set_actions()
+
+        start = time.perf_counter()
+        self.nodes = self.table_hits = 0
+        rng_state = random.getstate()
+        sim = self.battle.fork(Controller)
+        value, joint = self.search(sim, self.depth, -inf, inf, new_turn=False)
+        random.setstate(rng_state)
+        elapsed = time.perf_counter() - start
+        self.last_search = {
+            "value": value, "nodes": self.nodes, "table_hits": self.table_hits, "table_entries": len(self.table),
+            "elapsed": elapsed, "nodes_per_second": self.nodes / elapsed if elapsed else 0
+        }
+
+        if joint:
+            self.apply_actions(joint)
+        for mon in self.fielded_mons:
+            if not mon.fainted and mon.position not in dict(joint or ()):
+                self.get_action(mon)
+
+    def store(self, key: tuple, entry: tuple):
+        self.table[key] = entry
+        self.table.move_to_end(key)
+        if len(self.table) > self.table_size:
+            self.table.popitem(last=False)
+
+    def search(self, sim, depth: int, alpha: float, beta: float, new_turn: bool = True) -> tuple[float, tuple]:
+        """The value of the position for this side, with the actions that get it."""
+        self.nodes += 1
+        if depth == 0 or sim.check_winner() is not None:
+            return hp_balance(sim, self.id), ()
+        if new_turn:
+            sim.start_turn()
+        position_hash = self.zobrist.hash(sim)
+        key = (position_hash, depth)
+        best_first = ()
+        if (entry := self.table.get(key)) is not None:
+            self.table.move_to_end(key)
+            value, flag, best_first = entry
+            if flag == self.exact or (flag == self.lower and value >= beta) or \
+                    (flag == self.upper and value <= alpha):
+                self.table_hits += 1
+                return value, best_first
+
+        mine, theirs = sim.teams[self.id], sim.teams[1 - self.id]
+        options = mine.joint_options()
+        if best_first in options:  # the best move from last time is the most likely to cause cutoffs
+            options.remove(best_first)
+            options.insert(0, best_first)
+        replies = theirs.joint_options()
+        state = sim.snapshot()
+        original_alpha = alpha
+        best, best_joint = -inf, options[0]
+        for joint in options:
+            worst = inf
+            for reply in replies:
+                worst = min(worst, self.chance(sim, state, position_hash, depth, joint, reply))
+                if worst <= alpha:  # already no better than an option we have
+                    break
+            if worst > best:
+                best, best_joint = worst, joint
+            alpha = max(alpha, best)
+            if alpha >= beta:
+                break
+        sim.restore(state)
+
+        flag = self.upper if best <= original_alpha else self.lower if best >= beta else self.exact
+        self.store(key, (best, flag, best_joint))
+        return best, best_joint
+
+    def chance(self, sim, state, position_hash: int, depth: int, joint: tuple, reply: tuple) -> float:
+        """The mean value over a fixed set of samples of what can happen when both sides' actions are played out."""
+        total = 0
+        for n in range(self.samples):
+            sim.restore(state)
+            random.seed(position_hash ^ self.zobrist[("chance", joint, reply, n)])
+            sim.teams[self.id].apply_actions(joint)
+            sim.teams[1 - self.id].apply_actions(reply)
+            sim.resolve_turn()
+            total += self.search(sim, depth - 1, -inf, inf)[0]
+        return total / self.samples
+
 
 class Player(Controller):
     def __init__(self, mons: list[MiniMon] = (), **kwargs):
@@ -66,9 +415,9 @@ class Player(Controller):
                 else:
                     mon.next_action = f"!switch"
                     mon.targets = [switch]
-                    self.mons[mon.id]["field_status"] = "switching out"
-                    self.mons[switch]["field_status"] = "switching in"
-                    print(f"{MiniMon.from_mini_pack(self.mons[switch]).name} will switch in for {mon.name}.")
+                    self.mons[mon.id].field_status = "switching out"
+                    self.mons[switch].field_status = "switching in"
+                    print(f"{self.mons[switch].name} will switch in for {mon.name}.")
                     return
             else:
                 move = fixed_moves.get(selection)
@@ -110,3 +459,11 @@ class Player(Controller):
 
     def get_replacement(self, position: int) -> int:
         return self.switch_dialog(self.field.at(position), force=True)
+
+    async def set_actions_async(self):  # input() blocks, so wait for it in a thread instead of holding up the loop
+        import asyncio
+        await asyncio.to_thread(self.set_actions)
+
+    async def get_replacement_async(self, position: int) -> int:
+        import asyncio
+        return await asyncio.to_thread(self.get_replacement, position)
@@ -0,0 +1,105 @@
+from field import *
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the batch calculators
+    np = None
+
+
+damage_rolls = tuple(range(85, 101))
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("The batch damage calculator requires numpy.")
+
+
+def roll_multipliers():
+    require_numpy()
+    return np.array(damage_rolls) / 100
+
+
+def batch_raw_damage(attacker_levels, attacking_stats, defending_stats, powers):
+    """Vectorized raw_damage(); rounds half to even, as round() does."""
+    return np.round((2 * attacker_levels / 5 + 2) * powers * attacking_stats / defending_stats / 50 + 2)
+
+
+def damage_multiplier(pre_roll, roll, effectiveness, stab):
+    """The product of damage_roll()'s other multipliers, in the same order so floating-point results are identical."""
+    return pre_roll * roll * effectiveness * stab
+
+
+def type_chart_array():
+    """type_matrix as an (18, 18) array, indexed [attacking type][defending type] by type_indices."""
+    require_numpy()
+    return np.array(type_matrix)
+
+
+def batch_type_effectiveness(attacking_types: list[str | int], defenders: list[str | tuple[str, ...] | FieldMon]):
+    """The effectiveness of each attacking type (rows) against each defender (columns). Defenders may be given as a
+    single type, a tuple of types, or a FieldMon, whose current types (including tera) are used."""
+    require_numpy()
+    rows = np.array([
+        defensive_row(g.types if isinstance(g, FieldMon) else (g, ) if isinstance(g, str) else tuple(g))
+        for g in defenders
+    ]).reshape(len(defenders), len(types))
+    indices = [g if isinstance(g, int) else type_indices[g] for g in attacking_types]
+    return rows[:, indices].T
+
+
+def damage_distribution(field: Field, attackers: list[FieldMon], defenders: list[FieldMon], moves: list[Move],
+                        spread: list[bool] = None) -> dict[str]:
+    """Every possible damage roll for each (attacker, defender, move) triple, with and without a crit.
+
+    Uses the same multipliers as Field.damage_roll(), so each column of "damage" is exactly what damage_roll() gives
+    for that roll. Returns a dict of arrays: "damage" and "crit_damage" are (n, 16), one column per roll from 85% to
+    100%; "effectiveness" and "crit_chance" are (n,). Moves that always crit have identical "damage" and "crit_damage".
+    If spread is not given, each attacker's current targets decide whether the spread multiplier applies."""
+    require_numpy()
+    if not (len(attackers) == len(defenders) == len(moves)):
+        raise ValueError("attackers, defenders and moves must be the same length.")
+    n = len(moves)
+    if spread is None:
+        spread = [None] * n
+
+    levels = np.empty(n)
+    powers = np.empty(n)
+    effectiveness = np.empty(n)
+    stabs = np.empty(n)
+    chances = np.empty(n)
+    stats = np.empty((2, 2, n))  # crit or not, attacking or defending
+    pre_roll = np.empty((2, n))  # crit or not
+    exact = np.zeros(n)  # moves that deal fixed damage
+    unmodified = np.zeros(n, dtype=bool)
+
+    for i, (attacker, defender, move) in enumerate(zip(attackers, defenders, moves)):
+        levels[i] = attacker.level
+        powers[i] = move.power
+        effectiveness[i] = field.move_effectiveness(attacker, defender, move)
+        stabs[i] = field.stab(attacker, move)
+        always_crits = bool(move.get("always_crits", False))
+        chances[i] = 1 if always_crits else crit_chance(move.get("crit_rate_modifier", 0))
+        exact[i] = move["exact_damage"] or 0
+        unmodified[i] = bool(move["unmodified_damage"])
+        for crit in (0, 1):
+            stats[crit, :, i] = field.damage_stats(attacker, defender, move, bool(crit) or always_crits)
+            pre_roll[crit, i] = product(
+                field.pre_roll_multipliers(attacker, defender, move, bool(crit) or always_crits, spread[i])
+            )
+
+    rolls = roll_multipliers()
+    ret = {"effectiveness": effectiveness, "crit_chance": chances}
+    for crit, key in ((0, "damage"), (1, "crit_damage")):
+        raw = batch_raw_damage(levels, stats[crit, 0], stats[crit, 1], powers)[:, None]
+        total = damage_multiplier(pre_roll[crit][:, None], rolls[None, :], effectiveness[:, None], stabs[:, None])
+        damage = np.maximum(1, np.round(raw * total))
+        damage = np.where(unmodified[:, None], raw, damage)
+        damage = np.where(exact[:, None] > 0, exact[:, None], damage)
+        ret[key] = damage.astype(int)
+    return ret
+
+
+def damage_range(field: Field, attacker: FieldMon, defender: FieldMon, move: Move, **kwargs) -> dict[str]:
+    """damage_distribution() for a single triple."""
+    ret = damage_distribution(field, [attacker], [defender], [move], **kwargs)
+    return {k: v[0] for k, v in ret.items()}
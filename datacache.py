@@ -0,0 +1,75 @@
+import json
+import os
+import pickle
+from collections.abc import Callable, Mapping
+
+
+# The data directory defaults to the one next to this file, so imports don't depend on the working directory. Both it
+# and the cache directory can be overridden with environment variables, which have to be set before the first import.
+data_dir = os.environ.get("BATTLE_SIM_DATA", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+cache_dir = os.environ.get("BATTLE_SIM_CACHE", os.path.join(data_dir, ".cache"))
+cache_version = 1  # bump to invalidate every cache if the pickled format changes in a way signatures can't detect
+
+
+def data_path(filename: str) -> str:
+    return os.path.join(data_dir, filename)
+
+
+def load_json(filename: str):
+    with open(data_path(filename), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def file_signature(path: str) -> tuple[str, int, int]:
+    stat = os.stat(path)
+    return os.path.basename(path), stat.st_mtime_ns, stat.st_size
+
+
+def cached(section: str, sources: list[str], code_file: str, build: Callable[[], object]):
+    """Returns the objects built from some data files, loading them from the compiled cache if it's up to date with
+    both the data files and the module that defines their classes. Otherwise, builds them and rewrites the cache.
+    A cache that can't be read or written is ignored."""
+    signature = (cache_version, *(file_signature(data_path(g)) for g in sources), file_signature(code_file))
+    path = os.path.join(cache_dir, f"{section}.pickle")
+
+    try:
+        with open(path, "rb") as f:
+            if pickle.load(f) == signature:
+                return pickle.load(f)
+    except Exception:  # missing, stale, or unreadable (e.g. a class was renamed); rebuild below
+        pass
+
+    ret = build()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"  # write and rename, so other processes never see a partial cache
+        with open(temp_path, "wb") as f:
+            pickle.dump(signature, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(ret, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+    return ret
+
+
+class LazyTable(Mapping):
+    """A read-only table that's only loaded with cached() the first time it's used."""
+
+    def __init__(self, section: str, sources: list[str], code_file: str, build: Callable[[], Mapping]):
+        self.args = section, sources, code_file, build
+        self._table = None
+
+    @property
+    def table(self) -> Mapping:
+        if self._table is None:
+            self._table = cached(*self.args)
+        return self._table
+
+    def __getitem__(self, key):
+        return self.table[key]
+
+    def __iter__(self):
+        return iter(self.table)
+
+    def __len__(self):
+        return len(self.table)
@@ -13,6 +13,7 @@ weather_names = {
     winds: "Strong winds"
 }
 terrains = electric_terrain, grassy_terrain, misty_terrain, psychic_terrain = "electric", "grassy", "misty", "psychic"
+weather_suppressing_abilities = {"Cloud Nine", "Air Lock"}
 
 
 weather_spawning_abilities = {
@@ -85,6 +86,18 @@ class Fieldside:
         else:
             return [f"─ {g}" for g in self.summary()]
 
+    def save_state(self) -> tuple:
+        return (
+            self.reflect, self.reflect_timer, self.light_screen, self.light_screen_timer, self.aurora_veil,
+            self.aurora_veil_timer
+        )
+
+    def load_state(self, state: tuple):
+        (
+            self.reflect, self.reflect_timer, self.light_screen, self.light_screen_timer, self.aurora_veil,
+            self.aurora_veil_timer
+        ) = state
+
     def set_reflect(self, set_to: bool = True, turns: int = 5):
         self.reflect = set_to
         self.reflect_timer = turns if set_to else 0
@@ -112,9 +125,36 @@ class Field:
         self.terrain_timer = 0
         self.trick_room = False
         self.trick_room_timer = 0
+        self.abilities = set()  # of the living mons on the field; see update_abilities()
 
     def deploy_mon(self, mon: FieldMon | None, position: int):
         self.positions[position] = mon
+        self.update_abilities()
+
+    def update_abilities(self):
+        """Rebuilds self.abilities, for field-wide ability effects like the Ruin abilities."""
+        self.abilities = {g.ability for g in self.positions.values() if g is not None and not g.fainted}
+
+    def set_ability(self, mon: FieldMon, ability: str):
+        mon.set_ability(ability)
+        self.update_abilities()
+
+    def save_state(self) -> tuple:
+        """Weather, terrain, Trick Room, screens and positions, for Battle.snapshot()."""
+        return (
+            self.weather, self.weather_timer, self.terrain, self.terrain_timer, self.trick_room, self.trick_room_timer,
+            tuple(self.positions.items()), tuple(g.save_state() for g in self.sides)
+        )
+
+    def load_state(self, state: tuple):
+        (
+            self.weather, self.weather_timer, self.terrain, self.terrain_timer, self.trick_room, self.trick_room_timer,
+            positions, sides
+        ) = state
+        self.positions = dict(positions)
+        for side, side_state in zip(self.sides, sides):
+            side.load_state(side_state)
+        self.update_abilities()
 
     def at(self, position: int) -> FieldMon | None:
         return self.positions.get(position)
@@ -135,7 +175,7 @@ class Field:
 
     @property
     def active_weather(self):
-        return self.weather  # needs to be dynamic to account for Cloud Nine / Air Lock
+        return None if self.abilities & weather_suppressing_abilities else self.weather
 
     def targets(self, from_position: int, target: str) -> list[int]:
         if target == "user" or target == "all":
@@ -194,34 +234,56 @@ class Field:
         )
 
     def ability_on_field(self, *abilities: str) -> bool:
-        return any(g.has_ability(*abilities) for g in self.living_mons)
+        return not self.abilities.isdisjoint(abilities)
 
     def meets_conditional(self, user: FieldMon, conditional: dict[str]) -> bool:
         condition = conditional["condition"]
-        if condition.get("weather") is not None and self.weather != condition["weather"]:
+        if condition.get("weather") is not None and self.active_weather != condition["weather"]:
             return False
         if condition.get("user_in_terrain") is not None:
             if self.terrain != condition["user_in_terrain"] or not self.is_grounded(user):
                 return False
         return True
 
-    def apply_conditionals(self, user: FieldMon, move: Move) -> Move:
+    def apply_conditionals(self, user: FieldMon, move: Move, fresh: bool = False) -> Move:
+        # the move itself if no conditional applies, unless fresh: a clone for a use that changes it (e.g. its power)
         overwrites = {}
         for conditional in move.conditionals:
             if self.meets_conditional(user, conditional):
                 overwrites.update(conditional)
-        return move.clone(overwrites)
+        return move.clone(overwrites) if overwrites or fresh else move
 
     def move_effectiveness(self, attacker: FieldMon, defender: FieldMon, move: Move) -> float:
-        overwrites = {}
+        overwrites = {}  # e.g. Freeze-Dry, Scrappy; empty overwrites take the precomputed fast path
         return defender.type_effectiveness(move.type, overwrites)
 
     def damage_roll(self, attacker: FieldMon, defender: FieldMon, move: Move, **kwargs) -> dict[str]:
         if move["exact_damage"]:
             return {"damage": move["exact_damage"]}
 
+        crit = move.get("always_crits", False)
+        if kwargs.get("allow_crit", True) and not crit:
+            if random.random() < crit_chance(move.get("crit_rate_modifier", 0)):
+                crit = True
+
+        multipliers = self.pre_roll_multipliers(attacker, defender, move, crit)
+        multipliers.append(kwargs["force_random"] if kwargs.get("force_random") else (random.randrange(85, 101) / 100))
+
+        type_eff = self.move_effectiveness(attacker, defender, move)
+        multipliers.append(type_eff)
+        multipliers.append(self.stab(attacker, move))
+
+        damage = raw_damage(attacker.level, *self.damage_stats(attacker, defender, move, crit), move.power)
+        if not move["unmodified_damage"]:
+            damage = max(1, round(damage * product(multipliers)))
+
+        return {"damage": damage, "effectiveness": type_eff, "crit": crit}
+
+    def pre_roll_multipliers(self, attacker: FieldMon, defender: FieldMon, move: Move, crit: bool,
+                             spread: bool = None) -> list[float]:
+        """The damage multipliers applied before the random roll, in the order they're applied."""
         multipliers = []
-        if len(attacker.targets) > 1:
+        if (len(attacker.targets) > 1) if spread is None else spread:
             multipliers.append(0.75)
 
         # other multipliers to be added:
@@ -244,24 +306,18 @@ class Field:
         if attacker.status_condition == burn and move.category == physical:
             multipliers.append(0.5)
 
-        crit = move.get("always_crits", False)
-        if kwargs.get("allow_crit", True) and not crit:
-            if random.random() < crit_chance(move.get("crit_rate_modifier", 0)):
-                crit = True
         if crit:
             multipliers.append(1.5)
-
-        if not crit:
+        else:
             if move.category == physical and (self.side(defender).reflect or self.side(defender).aurora_veil):
                 multipliers.append(2/3 if self.size > 1 else 0.5)
             elif move.category == special and (self.side(defender).light_screen or self.side(defender).aurora_veil):
                 multipliers.append(2/3 if self.size > 1 else 0.5)
 
-        multipliers.append(kwargs["force_random"] if kwargs.get("force_random") else (random.randrange(85, 101) / 100))
-
-        type_eff = self.move_effectiveness(attacker, defender, move)
-        multipliers.append(type_eff)
+        return multipliers
 
+    @staticmethod
+    def stab(attacker: FieldMon, move: Move) -> float:
         stab = 1
         if attacker.terastallized:
             if move.type == attacker.tera_type:
@@ -271,48 +327,53 @@ class Field:
         else:
             if move.type in attacker.types:
                 stab += 0.5
-        multipliers.append(stab)
+        return stab
 
+    def damage_stats(self, attacker: FieldMon, defender: FieldMon, move: Move, crit: bool) -> tuple[int, int]:
+        """The attacking and defending stats used in the damage formula."""
         attack_stat = self.get_stat(
             defender if move["use_target_offense"] else attacker, move.attacking_stat, ignore_negative_stages=crit
         )
         defense_stat = self.get_stat(
             defender, move.defending_stat, ignore_positive_stages=crit
         )
+        return attack_stat, defense_stat
 
-        damage = raw_damage(attacker.level, attack_stat, defense_stat, move.power)
-        if not move["unmodified_damage"]:
-            damage = max(1, round(damage * product(multipliers)))
-
-        return {"damage": damage, "effectiveness": type_eff, "crit": crit}
-
-    def get_stat(self, mon: FieldMon, stat: str, **kwargs) -> int:
+    def stat_multipliers(self, mon: FieldMon, stat: str) -> list[float]:
+        """The multipliers applied to a stat after its stage, in the order they're applied."""
         multipliers = []
 
         if stat == "Atk":
-            if self.ability_on_field("Tablets of Ruin") and not mon.has_ability("Tablets of Ruin"):
+            if "Tablets of Ruin" in self.abilities and mon.ability != "Tablets of Ruin":
                 multipliers.append(0.75)
 
         if stat == "Def":
             if self.active_weather == snow and ice in mon.types:
                 multipliers.append(1.5)
-            if self.ability_on_field("Sword of Ruin") and not mon.has_ability("Sword of Ruin"):
+            if "Sword of Ruin" in self.abilities and mon.ability != "Sword of Ruin":
                 multipliers.append(0.75)
 
         if stat == "SpA":
-            if self.ability_on_field("Vessel of Ruin") and not mon.has_ability("Vessel of Ruin"):
+            if "Vessel of Ruin" in self.abilities and mon.ability != "Vessel of Ruin":
                 multipliers.append(0.75)
 
         if stat == "SpD":
             if self.active_weather == sandstorm and rock in mon.types:
                 multipliers.append(1.5)
-            if self.ability_on_field("Beads of Ruin") and not mon.has_ability("Beads of Ruin"):
+            if "Beads of Ruin" in self.abilities and mon.ability != "Beads of Ruin":
                 multipliers.append(0.75)
 
         if stat == "Spe":
             if mon.status_condition == paralysis:
                 multipliers.append(0.5)
 
+        if handler := mon.handlers.get("stat"):
+            multipliers.append(handler(self, mon, stat))
+
+        return multipliers
+
+    def get_stat(self, mon: FieldMon, stat: str, **kwargs) -> int:
+        multipliers = self.stat_multipliers(mon, stat)
         if kwargs.get("ignore_stages") or (kwargs.get("ignore_positive_stages") and mon.stat_stages[stat] > 0) or \
                 (kwargs.get("ignore_negative_stages") and mon.stat_stages[stat] < 0):
             baseline = mon.stats.get(stat, 1)
@@ -1,4 +1,4 @@
-import json
+from datacache import *
 
 
 class HeldItem:
@@ -18,4 +18,6 @@ class HeldItem:
         return {"name": self.name, "category": self.category, **self.data}
 
 
-all_items = {g: HeldItem.from_json(j) for g, j in json.load(open("data/items.json")).items()}
+all_items = cached(
+    "items", ["items.json"], __file__, lambda: {g: HeldItem.from_json(j) for g, j in load_json("items.json").items()}
+)
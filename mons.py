@@ -1,5 +1,6 @@
 from moves import *
 from items import *
+from collections.abc import Iterable
 
 
 six_stats = ["HP", "Atk", "Def", "SpA", "SpD", "Spe"]
@@ -38,6 +39,22 @@ ruinous_abilities = {
 }
 
 
+# ability: {event: handler}; the handlers themselves are registered in abilities.py. Every FieldMon keeps a reference to
+# its ability's table, so the engine only calls handlers that exist. Events and handler arguments:
+#   "send_out" (battle, mon), "contact" (battle, defender, attacker, move) after a contact move hits the defender,
+#   "stat" (field, mon, stat) -> multiplier for the mon's own stats, and "end_of_turn" (battle, mon)
+ability_handlers = {}
+
+
+def ability_handler(event: str, *abilities: str):
+    """Registers the decorated function as the handler for an event for each of the given abilities."""
+    def decorator(func):
+        for ability in abilities:
+            ability_handlers.setdefault(ability, {})[event] = func
+        return func
+    return decorator
+
+
 def sign(n: int | float) -> int:
     return 1 if n > 0 else -1 if n < 0 else 0
 
@@ -93,6 +110,7 @@ class Species:
     def __init__(self, name: str, forms: list[Form], gender_ratio: str = "1:1"):
         self.name = name
         self.forms = {g.name: g for g in forms}
+        self.fixed_forms = {fix(g): g for g in self.forms}
         self.gender_ratio = gender_ratio
 
     @staticmethod
@@ -115,9 +133,8 @@ class Species:
             return self.forms["F" if name == female else ""]
         if (not name) or fix(name) == "base" or name == male:
             return self.forms[list(self.forms)[0]]
-        for form in self.forms:
-            if fix(name) == fix(form):
-                return self.forms[form]
+        if (form := self.fixed_forms.get(fix(name))) is not None:
+            return self.forms[form]
         raise KeyError(f"Invalid form name for {self.name}: {name}")
 
     def random_gender(self):
@@ -218,7 +235,10 @@ class Evolution:
         return self.read_out(False)
 
 
-evolutions = {g: [Evolution.from_json(k) for k in j] for g, j in json.load(open("data/evolutions.json")).items()}
+evolutions = LazyTable(  # battles never need these, so they're only loaded when something looks one up
+    "evolutions", ["evolutions.json"], __file__,
+    lambda: {g: [Evolution.from_json(k) for k in j] for g, j in load_json("evolutions.json").items()}
+)
 
 
 nature_table = [
@@ -231,13 +251,47 @@ nature_table = [
 ]
 
 
+pokepaste_name_line = re.compile(  # modified from https://github.com/felixphew/pokepaste/blob/v3/syntax.go
+    r"^(?:(?P<nick>.* \()(?P<species1>[A-Z][a-z0-9:'éé]+\.?(?:[- ][A-Za-z][a-z0-9:'éé]*\.?)*)"
+    r"(\))|(?P<species2>[A-Z][a-z0-9:'éé]+\.?(?:[- ][A-Za-z][a-z0-9:'éé]*\.?)*))(?:( \()"
+    r"(?P<gender>[MF])(\)))?(?:( @ )(?P<item>[A-Za-z0-9:'éé]*(?:[- ][A-Za-z0-9:'éé]*)*))?( *)$"
+)
+pokepaste_nature_line = re.compile(r"(?P<nature>[A-Za-z]+) Nature")
+pokepaste_move_line = re.compile(  # modified from above git repo
+    r"- ?(?P<name>[A-Za-z0-9']*(?:[\- ,][A-Za-z0-9']*)*)(?: \[(?P<type>[A-Z][a-z]+)])?"
+)
+pokepaste_lines = {  # by label
+    "Level": re.compile(r"Level: (?P<level>\d+)"),
+    "EVs": re.compile(  # from the same git repo as above
+        r"(?a)EVs: ((?P<hp>\d+) HP)?( / )?((?P<atk>\d+) Atk)?( / )?((?P<def>\d+) Def)?( / )?"
+        r"((?P<spa>\d+) SpA)?( / )?((?P<spd>\d+) SpD)?( / )?((?P<spe>\d+) Spe)?( *)"
+    ),
+    "IVs": re.compile(
+        r"(?a)IVs: ((?P<hp>\d+) HP)?( / )?((?P<atk>\d+) Atk)?( / )?((?P<def>\d+) Def)?( / )?"
+        r"((?P<spa>\d+) SpA)?( / )?((?P<spd>\d+) SpD)?( / )?((?P<spe>\d+) Spe)?( *)"
+    ),
+    "Ability": re.compile(r"Ability: (?P<ability>[A-Za-z \-'()]+)"),
+    "Tera Type": re.compile(r"Tera Type: (?P<tera>[A-Za-z]+)")
+}
+
+
+mini_mon_kwargs = (
+    "species_and_form", "species", "form", "nickname", "level", "gender", "nature", "ivs", "evs", "ability",
+    "held_item", "tera_type", "move_names"
+)
+
+
 class MiniMon:
+    __slots__ = (
+        "nickname", "_species", "_form", "_level", "gender", "_nature", "_nature_index", "_ivs", "_evs", "ability",
+        "held_item", "tera_type", "move_names", "_stats", "_stat_dict"
+    )
+
     def __init__(self, species_and_form: str = None, **kwargs):
+        self._stats = self._stat_dict = None
         self.nickname = kwargs.get("nickname")
         if species_and_form:
-            species, form = fixed_species_and_forms[fix(species_and_form)]
-            self.species = all_species[species]
-            self.form = self.species.get_form(form)
+            self.species, self.form = name_index()[fix(species_and_form)]["species"]
         elif species := kwargs.get("species"):
             if isinstance(species, Species):
                 self.species = species
@@ -284,9 +338,70 @@ class MiniMon:
     def verbose_name(self):
         return f"{self.nickname} ({self.species_and_form})" if self.nickname else self.species_and_form
 
+    # Stats are calculated once and cached. Anything they depend on is a property that clears the cache when set; IVs
+    # and EVs are stored as tuples so they can't be changed in place without going through their setters.
+
+    def clear_stats(self):
+        self._stats = self._stat_dict = None
+
+    @property
+    def species(self) -> Species:
+        return self._species
+
+    @species.setter
+    def species(self, species: Species):
+        self._species = species
+        self.clear_stats()
+
+    @property
+    def form(self) -> Form:
+        return self._form
+
+    @form.setter
+    def form(self, form: Form):
+        self._form = form
+        self.clear_stats()
+
+    @property
+    def level(self) -> int:
+        return self._level
+
+    @level.setter
+    def level(self, level: int):
+        self._level = level
+        self.clear_stats()
+
+    @property
+    def nature(self) -> str:
+        return self._nature
+
+    @nature.setter
+    def nature(self, nature: str):
+        self._nature_index = nature_table.index(nature)
+        self._nature = nature
+        self.clear_stats()
+
+    @property
+    def ivs(self) -> tuple[int, ...]:
+        return self._ivs
+
+    @ivs.setter
+    def ivs(self, ivs: list[int]):
+        self._ivs = tuple(ivs)
+        self.clear_stats()
+
+    @property
+    def evs(self) -> tuple[int, ...]:
+        return self._evs
+
+    @evs.setter
+    def evs(self, evs: list[int]):
+        self._evs = tuple(evs)
+        self.clear_stats()
+
     @property
     def nature_index(self):
-        return nature_table.index(self.nature)
+        return self._nature_index
 
     @property
     def nature_effects(self):
@@ -299,50 +414,55 @@ class MiniMon:
     def base_stats(self):
         return self.form.base_stats
 
+    def calculate_stats(self) -> tuple[int, ...]:
+        form, level, ivs, evs = self.form, self.level, self.ivs, self.evs
+        if self.species.name == "Shedinja":
+            ret = [1]
+        else:
+            ret = [floor((2 * form.hp + ivs[0] + floor(evs[0] / 4)) * level / 100) + level + 10]
+        for n, base in enumerate((form.atk, form.dfn, form.spa, form.spd, form.spe)):
+            ret.append(floor(
+                (floor((2 * base + ivs[n + 1] + floor(evs[n + 1] / 4)) * level / 100) + 5) *
+                (1 + 0.1 * ((self.nature_index // 5 == n) - (self.nature_index % 5 == n)))
+            ))
+        return tuple(ret)
+
+    @property
+    def stat_values(self) -> tuple[int, ...]:
+        """HP, Atk, Def, SpA, SpD, and Spe, in that order."""
+        if self._stats is None:
+            self._stats = self.calculate_stats()
+        return self._stats
+
     @property
     def hp(self):
-        if self.species.name == "Shedinja":
-            return 1
-        return floor((2 * self.form.hp + self.ivs[0] + floor(self.evs[0] / 4)) * self.level / 100) + self.level + 10
+        return self.stat_values[0]
 
     @property
     def atk(self):
-        return floor(
-            (floor((2 * self.form.atk + self.ivs[1] + floor(self.evs[1] / 4)) * self.level / 100) + 5) *
-            (1 + 0.1 * ((self.nature_index // 5 == 0) - (self.nature_index % 5 == 0)))
-        )
+        return self.stat_values[1]
 
     @property
     def dfn(self):
-        return floor(
-            (floor((2 * self.form.dfn + self.ivs[2] + floor(self.evs[2] / 4)) * self.level / 100) + 5) *
-            (1 + 0.1 * ((self.nature_index // 5 == 1) - (self.nature_index % 5 == 1)))
-        )
+        return self.stat_values[2]
 
     @property
     def spa(self):
-        return floor(
-            (floor((2 * self.form.spa + self.ivs[3] + floor(self.evs[3] / 4)) * self.level / 100) + 5) *
-            (1 + 0.1 * ((self.nature_index // 5 == 2) - (self.nature_index % 5 == 2)))
-        )
+        return self.stat_values[3]
 
     @property
     def spd(self):
-        return floor(
-            (floor((2 * self.form.spd + self.ivs[4] + floor(self.evs[4] / 4)) * self.level / 100) + 5) *
-            (1 + 0.1 * ((self.nature_index // 5 == 3) - (self.nature_index % 5 == 3)))
-        )
+        return self.stat_values[4]
 
     @property
     def spe(self):
-        return floor(
-            (floor((2 * self.form.spe + self.ivs[5] + floor(self.evs[5] / 4)) * self.level / 100) + 5) *
-            (1 + 0.1 * ((self.nature_index // 5 == 4) - (self.nature_index % 5 == 4)))
-        )
+        return self.stat_values[5]
 
     @property
     def stats(self):
-        return {"HP": self.hp, "Atk": self.atk, "Def": self.dfn, "SpA": self.spa, "SpD": self.spd, "Spe": self.spe}
+        if self._stat_dict is None:
+            self._stat_dict = dict(zip(six_stats, self.stat_values))
+        return self._stat_dict
 
     @property
     def has_nontrivial_gender(self):
@@ -367,59 +487,50 @@ class MiniMon:
 
     @staticmethod
     def from_pokepaste(paste: str):
+        return MiniMon(**MiniMon.pokepaste_kwargs(paste.splitlines()))
+
+    @staticmethod
+    def pokepaste_kwargs(lines: Iterable[str]) -> dict:
+        """Parses the lines of a single set into MiniMon kwargs. Lines that aren't recognized are skipped."""
         ret = {}
         move_names = []
-        for line in paste.splitlines():
+        for line in lines:
             if not ret:
-                if not (match := re.match(  # modified from https://github.com/felixphew/pokepaste/blob/v3/syntax.go
-                    r"^(?:(?P<nick>.* \()(?P<species1>[A-Z][a-z0-9:'éé]+\.?(?:[- ][A-Za-z][a-z0-9:'éé]*\.?)*)"
-                    r"(\))|(?P<species2>[A-Z][a-z0-9:'éé]+\.?(?:[- ][A-Za-z][a-z0-9:'éé]*\.?)*))(?:( \()"
-                    r"(?P<gender>[MF])(\)))?(?:( @ )(?P<item>[A-Za-z0-9:'éé]*(?:[- ][A-Za-z0-9:'éé]*)*))?( *)$", line
-                )):
+                if not (match := pokepaste_name_line.match(line)):
                     continue
-                else:
-                    if match.group("species1"):
-                        ret["species_and_form"] = match.group("species1")
-                    elif match.group("species2"):
-                        ret["species_and_form"] = match.group("species2")
-                    if match.group("nick"):
-                        ret["nickname"] = match.group("nick")[:-2]
-                    if match.group("gender"):
-                        ret["gender"] = male if match.group("gender") == "M" else female
-                    if match.group("item"):
-                        ret["held_item"] = match.group("item")
-
-            elif match := re.fullmatch(r"Level: (?P<level>\d+)", line):
-                ret["level"] = int(match.group("level"))
-
-            elif match := re.fullmatch(r"(?P<nature>[A-Za-z]+) Nature", line):
-                ret["nature"] = match.group("nature")
-
-            elif match := re.fullmatch(  # from the same git repo as above
-                r"(?a)EVs: ((?P<hp>\d+) HP)?( / )?((?P<atk>\d+) Atk)?( / )?((?P<def>\d+) Def)?( / )?"
-                r"((?P<spa>\d+) SpA)?( / )?((?P<spd>\d+) SpD)?( / )?((?P<spe>\d+) Spe)?( *)", line
-            ):
-                ret["evs"] = [int(g) if g is not None else 0 for g in match.groupdict().values()]
-
-            elif match := re.fullmatch(
-                r"(?a)IVs: ((?P<hp>\d+) HP)?( / )?((?P<atk>\d+) Atk)?( / )?((?P<def>\d+) Def)?( / )?"
-                r"((?P<spa>\d+) SpA)?( / )?((?P<spd>\d+) SpD)?( / )?((?P<spe>\d+) Spe)?( *)", line
-            ):
-                ret["ivs"] = [int(g) if g is not None else 31 for g in match.groupdict().values()]
-
-            elif match := re.fullmatch(r"Ability: (?P<ability>[A-Za-z \-'()]+)", line):
-                ret["ability"] = match.group("ability")
+                if match.group("species1"):
+                    ret["species_and_form"] = match.group("species1")
+                elif match.group("species2"):
+                    ret["species_and_form"] = match.group("species2")
+                if match.group("nick"):
+                    ret["nickname"] = match.group("nick")[:-2]
+                if match.group("gender"):
+                    ret["gender"] = male if match.group("gender") == "M" else female
+                if match.group("item"):
+                    ret["held_item"] = match.group("item")
+
+            elif line.startswith("-") and (match := pokepaste_move_line.fullmatch(line)):
+                move_names.append(match.group("name") + (f" [{match.group('type')}]" if match.group("type") else ""))
 
-            elif match := re.fullmatch(r"Tera Type: (?P<tera>[A-Za-z]+)", line):
-                ret["tera_type"] = match.group("tera")
+            elif line.endswith(" Nature") and (match := pokepaste_nature_line.fullmatch(line)):
+                ret["nature"] = match.group("nature")
 
-            elif match := re.fullmatch(  # modified from above git repo
-                r"- ?(?P<name>[A-Za-z0-9']*(?:[\- ,][A-Za-z0-9']*)*)(?: \[(?P<type>[A-Z][a-z]+)])?", line
-            ):
-                move_names.append(match.group("name") + (f" [{match.group('type')}]" if match.group("type") else ""))
+            # only try the pattern for the line's label, rather than every pattern against every line
+            elif (pattern := pokepaste_lines.get(label := line.partition(":")[0])) and \
+                    (match := pattern.fullmatch(line)):
+                if label == "Level":
+                    ret["level"] = int(match.group("level"))
+                elif label == "EVs":
+                    ret["evs"] = [int(g) if g is not None else 0 for g in match.groupdict().values()]
+                elif label == "IVs":
+                    ret["ivs"] = [int(g) if g is not None else 31 for g in match.groupdict().values()]
+                elif label == "Ability":
+                    ret["ability"] = match.group("ability")
+                else:
+                    ret["tera_type"] = match.group("tera")
 
         ret["move_names"] = move_names
-        return MiniMon(**ret)
+        return ret
 
     def mini_pack(self, include_move_names: bool = True):
         return {
@@ -437,14 +548,72 @@ class MiniMon:
         return FieldMon(**self.mini_pack(), **kwargs)
 
 
-all_species = {k: Species.from_json(v) for k, v in json.load(open("data/mons.json")).items()}
-fixed_species_and_forms = {fix(g): (g, "") for g in all_species} | {
-    fix(MiniMon(species=sp, form=fm).species_and_form): (sp, fm.name)
-    for sp, v in all_species.items() for fm in v.forms.values()
+def build_species() -> tuple[dict[str, Species], dict[str, tuple[str, str]]]:
+    species = {k: Species.from_json(v) for k, v in load_json("mons.json").items()}
+    return species, {fix(g): (g, "") for g in species} | {
+        fix(MiniMon(species=v, form=fm).species_and_form): (sp, fm.name)
+        for sp, v in species.items() for fm in v.forms.values()
+    }
+
+
+all_species, fixed_species_and_forms = cached("species", ["mons.json"], __file__, build_species)
+
+
+# "Alolan Raichu", "Mega Charizard X", etc. are also accepted for forms whose names start with one of these
+form_prefixes = {
+    "Mega": "Mega", "Primal": "Primal", "Alola": "Alolan", "Galar": "Galarian", "Hisui": "Hisuian", "Paldea": "Paldean"
 }
 
 
+def build_name_keys() -> dict[str, dict[str]]:
+    ret = {}
+    for k, (species, form) in fixed_species_and_forms.items():
+        ret.setdefault(k, {})["species"] = (species, form)
+        if (words := form.split()) and words[0] in form_prefixes:
+            alias = fix(" ".join([form_prefixes[words[0]], species, *words[1:]]))
+            ret.setdefault(alias, {}).setdefault("species", (species, form))
+    for k, g in fixed_moves.items():
+        ret.setdefault(k, {})["move"] = g
+    for g in all_items:
+        ret.setdefault(fix(g), {})["item"] = g
+    return ret
+
+
+@lru_cache(maxsize=None)
+def name_index() -> dict[str, dict[str]]:
+    """normalized name: {"species": (Species, Form), "move": Move, "item": HeldItem}, built on first use."""
+    ret = {}
+    for k, v in cached("names", ["mons.json", "moves.json", "items.json"], __file__, build_name_keys).items():
+        ret[k] = entry = {}
+        if "species" in v:
+            entry["species"] = (species := all_species[v["species"][0]]), species.get_form(v["species"][1])
+        if "move" in v:
+            entry["move"] = all_moves[v["move"]]
+        if "item" in v:
+            entry["item"] = all_items[v["item"]]
+    return ret
+
+
+def lookup(name: str, kind: str = None):
+    """Finds a species and form, move, or item by name. kind is only needed for names shared by more than one."""
+    entries = name_index().get(fix(name), {})  # moves and items are the shared all_moves/all_items entries
+    if kind is not None:
+        if kind not in entries:
+            raise KeyError(f"Invalid {kind} name: {name}")
+        return entries[kind]
+    if len(entries) != 1:
+        raise KeyError(f"{'Ambiguous' if entries else 'Invalid'} name: {name}")
+    return next(iter(entries.values()))
+
+
 class FieldMon(MiniMon):
+    __slots__ = (
+        "moves", "remaining_hp", "status_condition", "status_timer", "terastallized", "type1", "type2", "type3",
+        "stat_stages", "id", "team_id", "position", "next_action", "targets", "turn_on_field", "has_taken_turn",
+        "has_executed_move", "has_landed_move", "failed_last_attack", "fainted", "field_status", "other_data",
+        "handlers"
+    )
+
     def __init__(self, **kwargs):  # should never be called directly; use other functions to build
         super().__init__(**kwargs)
 
@@ -462,9 +631,7 @@ class FieldMon(MiniMon):
         self.status_timer = kwargs.pop("status_timer", 0)
         self.terastallized = kwargs.pop("terastallized", False)
 
-        self.type1 = self.form.type1
-        self.type2 = self.form.type2
-        self.type3 = None
+        self.reset_types()
 
         self.stat_stages = kwargs.pop(
             "stat_stages", {"Atk": 0, "Def": 0, "SpA": 0, "SpD": 0, "Spe": 0, "Acc": 0, "Eva": 0}
@@ -483,7 +650,11 @@ class FieldMon(MiniMon):
         self.failed_last_attack = False
 
         self.fainted = kwargs.pop("fainted", False)  # set manually to keep from sending multiple "x fainted!" messages
-        self.other_data = kwargs
+        self.field_status = kwargs.pop(  # also "switching in" / "switching out" while a switch is pending
+            "field_status", "fainted" if self.fainted else "on field" if self.position != -1 else "benched"
+        )
+        self.other_data = {k: v for k, v in kwargs.items() if k not in mini_mon_kwargs}
+        self.handlers = ability_handlers.setdefault(self.ability, {})  # shared, so later registrations still apply
 
     def __bool__(self):
         return not self.fainted
@@ -515,6 +686,51 @@ class FieldMon(MiniMon):
     def get(self, item: str, default_value=None):
         return self.other_data.get(item, default_value)
 
+    def reset_types(self):
+        self.type1 = self.form.type1
+        self.type2 = self.form.type2
+        self.type3 = None
+
+    def withdraw(self):
+        """Clears what doesn't persist when a mon leaves the field. HP, PP, status and terastallization are kept."""
+        self.reset_types()
+        self.stat_stages = {"Atk": 0, "Def": 0, "SpA": 0, "SpD": 0, "Spe": 0, "Acc": 0, "Eva": 0}
+        if self.status_condition != sleep:
+            self.status_timer = 0
+        self.next_action = ""
+        self.targets = []
+        self.turn_on_field = 0
+        self.has_taken_turn = False
+        self.has_executed_move = False
+        self.has_landed_move = False
+        self.failed_last_attack = False
+        self.other_data = {}
+
+    def save_state(self) -> tuple:
+        """Everything about this mon that can change during a battle, as a tuple for Battle.snapshot()."""
+        return (
+            self.remaining_hp, self.status_condition, self.status_timer, self.terastallized, self.type1, self.type2,
+            self.type3, tuple(self.stat_stages.items()), self.id, self.team_id, self.position, self.next_action,
+            tuple(self.targets), self.turn_on_field, self.has_taken_turn, self.has_executed_move, self.has_landed_move,
+            self.failed_last_attack, self.fainted, self.field_status, self.other_data.copy(), self.ability,
+            self.held_item, tuple(g.remaining_pp for g in self.moves.values())
+        )
+
+    def load_state(self, state: tuple):
+        (
+            self.remaining_hp, self.status_condition, self.status_timer, self.terastallized, self.type1, self.type2,
+            self.type3, stat_stages, self.id, self.team_id, self.position, self.next_action,
+            targets, self.turn_on_field, self.has_taken_turn, self.has_executed_move, self.has_landed_move,
+            self.failed_last_attack, self.fainted, self.field_status, other_data, self.ability,
+            self.held_item, remaining_pp
+        ) = state
+        self.stat_stages = dict(stat_stages)
+        self.targets = list(targets)
+        self.other_data = other_data.copy()  # copied again so the same state can be loaded more than once
+        self.handlers = ability_handlers.setdefault(self.ability, {})
+        for move, pp in zip(self.moves.values(), remaining_pp):
+            move.remaining_pp = pp
+
     def clear(self, item: str):
         if item in self.other_data:
             del self.other_data[item]
@@ -541,16 +757,16 @@ class FieldMon(MiniMon):
             return 10
         return 0
 
-    @property
-    def field_status(self):
-        return "fainted" if self.fainted else "on field" if self.position != -1 else "benched"
-
     @property
     def immune_to_sand(self):
         return any(g in self.types for g in (rock, ground, steel))
 
     def has_ability(self, *abilities: str) -> bool:
-        return bool({self.ability}.intersection(set(abilities)))
+        return self.ability in abilities
+
+    def set_ability(self, ability: str):
+        self.ability = ability
+        self.handlers = ability_handlers.setdefault(ability, {})
 
     def heal(self, healing: int) -> int:
         initial_hp = self.remaining_hp
@@ -565,6 +781,8 @@ class FieldMon(MiniMon):
     def type_effectiveness(self, attacking_type: str, overwrites: dict[tuple[str, str], float] = ()) -> float:
         if not attacking_type:
             return 1
+        if not overwrites:
+            return defensive_row(self.types)[type_indices[attacking_type]]
         return round(product(
             dict(overwrites).get((attacking_type, g), type_effectiveness[attacking_type][g])
             for g in self.types
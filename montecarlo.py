@@ -0,0 +1,144 @@
+from battle import *
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+import time
+
+
+class MatchupResults:
+    def __init__(self, names: list[list[str]], trainers: list[str] = ("Team 1", "Team 2")):
+        self.names = names
+        self.trainers = list(trainers)
+        self.battles = 0
+        self.wins = [0, 0]
+        self.draws = 0  # battles that hit the turn limit without a winner
+        self.turn_counts = Counter()
+        self.faints = [[0] * len(g) for g in names]
+        self.elapsed = 0.0
+
+    def add_battle(self, winner: int | None, turns: int, fainted: list[list[bool]]):
+        self.battles += 1
+        if winner is None:
+            self.draws += 1
+        else:
+            self.wins[winner] += 1
+        self.turn_counts[turns] += 1
+        for side, flags in enumerate(fainted):
+            for slot, flag in enumerate(flags):
+                self.faints[side][slot] += flag
+
+    def merge(self, other: "MatchupResults"):
+        self.battles += other.battles
+        self.wins = [g + other.wins[n] for n, g in enumerate(self.wins)]
+        self.draws += other.draws
+        self.turn_counts.update(other.turn_counts)
+        self.faints = [[g + other.faints[side][slot] for slot, g in enumerate(j)] for side, j in enumerate(self.faints)]
+
+    @property
+    def win_rates(self) -> list[float]:
+        return [g / self.battles if self.battles else 0 for g in self.wins]
+
+    @property
+    def mean_turns(self) -> float:
+        return sum(k * v for k, v in self.turn_counts.items()) / self.battles if self.battles else 0
+
+    @property
+    def faint_rates(self) -> list[list[float]]:
+        return [[g / self.battles if self.battles else 0 for g in side] for side in self.faints]
+
+    @property
+    def battles_per_second(self) -> float:
+        return self.battles / self.elapsed if self.elapsed else 0
+
+    def json(self):
+        return {
+            "battles": self.battles, "wins": self.wins, "draws": self.draws, "win_rates": self.win_rates,
+            "mean_turns": self.mean_turns, "min_turns": min(self.turn_counts, default=0),
+            "max_turns": max(self.turn_counts, default=0),
+            "turn_counts": {str(k): v for k, v in sorted(self.turn_counts.items())},
+            "faints": [
+                {self.names[side][slot]: g for slot, g in enumerate(j)} for side, j in enumerate(self.faints)
+            ],
+            "elapsed": self.elapsed, "battles_per_second": self.battles_per_second
+        }
+
+    def summary(self) -> str:
+        ret = [
+            f"{self.battles} battles in {self.elapsed:.2f}s ({self.battles_per_second:.1f} battles/s)",
+            f"Mean length: {self.mean_turns:.1f} turns"
+        ]
+        for side in range(2):
+            ret.append(f"{self.trainers[side]}: {self.wins[side]} wins ({100 * self.win_rates[side]:.1f}%)")
+            ret.extend(
+                f"  {self.names[side][slot]}: fainted in {100 * g:.1f}% of battles"
+                for slot, g in enumerate(self.faint_rates[side])
+            )
+        if self.draws:
+            ret.append(f"Unfinished: {self.draws}")
+        return "\n".join(ret)
+
+
+def team_spec(team: Team | list[MiniMon | dict], default_trainer: str = "Trainer") -> tuple[type, str, list[dict]]:
+    """Reduces a Team, Controller, or list of mons to a picklable (controller class, trainer, mini packs) triple.
+    Plain Teams, base Controllers, and lists of mons are driven by a BasicAI."""
+    if isinstance(team, Team):
+        if isinstance(team, Player):
+            raise ValueError("Player controllers can't be used in simulations.")
+        controller = type(team) if isinstance(team, Controller) and type(team) is not Controller else BasicAI
+        return controller, team.trainer, [g.mini_pack() for g in team.ordered_mons]
+    return BasicAI, default_trainer, [g if isinstance(g, dict) else g.mini_pack() for g in team]
+
+
+def run_battle(spec1: tuple[type, str, list[dict]], spec2: tuple[type, str, list[dict]], size: int = 1,
+               seed: int = None, max_turns: int = 500) -> Battle:
+    if seed is not None:
+        random.seed(seed)
+    teams = [
+        controller([MiniMon.from_mini_pack(g) for g in packs], trainer=trainer)
+        for controller, trainer, packs in (spec1, spec2)
+    ]
+    battle = Battle(teams, size, sink=NullSink())
+    battle.run(max_turns)
+    return battle
+
+
+def _run_chunk(spec1, spec2, size: int, seeds: list[int], max_turns: int) -> MatchupResults:
+    results = MatchupResults(
+        [[MiniMon.from_mini_pack(g).name for g in spec[2]] for spec in (spec1, spec2)], [spec1[1], spec2[1]]
+    )
+    for seed in seeds:
+        battle = run_battle(spec1, spec2, size, seed, max_turns)
+        results.add_battle(
+            battle.check_winner(), battle.turn_count,
+            [[g.fainted for g in team.mons.values()] for team in battle.teams]
+        )
+    return results
+
+
+def simulate_matchup(team1: Team | list[MiniMon | dict], team2: Team | list[MiniMon | dict], battles: int,
+                     size: int = 1, workers: int = None, seed: int = None, max_turns: int = 500,
+                     chunk_size: int = None) -> MatchupResults:
+    """Runs the same matchup many times over a process pool and aggregates the results.
+    Each battle is seeded separately, so a given seed always gives the same results regardless of worker count."""
+    spec1, spec2 = team_spec(team1, "Team 1"), team_spec(team2, "Team 2")
+    workers = workers or os.cpu_count() or 1
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    seeds = [seed + n for n in range(battles)]
+    if chunk_size is None:  # several chunks per worker, so the pool stays balanced when some battles run long
+        chunk_size = max(1, min(250, battles // (workers * 8)))
+
+    start = time.perf_counter()
+    results = _run_chunk(spec1, spec2, size, [], max_turns)
+    if workers == 1:
+        results.merge(_run_chunk(spec1, spec2, size, seeds, max_turns))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_run_chunk, spec1, spec2, size, seeds[n:n + chunk_size], max_turns)
+                for n in range(0, battles, chunk_size)
+            ]
+            for future in as_completed(futures):
+                results.merge(future.result())
+    results.elapsed = time.perf_counter() - start
+    return results
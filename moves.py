@@ -2,9 +2,12 @@ import json
 import re
 import random
 from copy import copy
+from functools import lru_cache
 from math import floor
+from datacache import *
 
 
+@lru_cache(maxsize=1 << 16)  # names are looked up over and over (player input, team imports), and there aren't many
 def fix(s: str, joiner: str = "-"):
     return re.sub(
         f"{joiner}+", joiner, re.sub(
@@ -15,8 +18,9 @@ def fix(s: str, joiner: str = "-"):
     )
 
 
-def load_type_chart(path: str = "data/types.json") -> dict[str | None, dict[str, float]]:
-    return json.load(open(path))
+def load_type_chart(path: str = None) -> dict[str | None, dict[str, float]]:
+    with open(path or data_path("types.json"), encoding="utf-8") as f:
+        return json.load(f)
 
 
 types = normal, fire, water, electric, grass, ice, fighting, poison, ground, flying, psychic, bug, rock, ghost, \
@@ -24,6 +28,43 @@ types = normal, fire, water, electric, grass, ice, fighting, poison, ground, fly
     "Ground", "Flying", "Psychic", "Bug", "Rock", "Ghost", "Dragon", "Dark", "Steel", "Fairy"
 categories = physical, special, status = "Physical", "Special", "Status"
 type_effectiveness = load_type_chart()
+type_indices = {g: n for n, g in enumerate(types)}
+type_matrix = [[type_effectiveness[a][d] for d in types] for a in types]  # [attacking type][defending type]
+
+
+def calculate_defensive_row(defending_types: tuple[str, ...]) -> tuple[float, ...]:
+    """The effectiveness of every attacking type, in type_indices order, against a mon with the given types."""
+    indices = [type_indices[g] for g in defending_types]
+    row = []
+    for attacking in type_matrix:
+        multiplier = 1
+        for g in indices:
+            multiplier *= attacking[g]
+        row.append(round(multiplier, 3))
+    return tuple(row)
+
+
+def build_defensive_rows() -> dict[tuple[str, ...], tuple[float, ...]]:
+    """Rows for every single, dual and tera typing. Three-type combos are rare, so they're built on demand."""
+    rows = {}
+    for type1 in types:
+        rows[(type1, )] = calculate_defensive_row((type1, ))
+        for type2 in types:
+            if type2 != type1:
+                rows[(type1, type2)] = calculate_defensive_row((type1, type2))
+    return rows
+
+
+# types (tuple): effectiveness of each attacking type against a mon with those types
+defensive_rows = cached("types", ["types.json"], __file__, build_defensive_rows)
+
+
+def defensive_row(defending_types: tuple[str, ...]) -> tuple[float, ...]:
+    try:
+        return defensive_rows[defending_types]
+    except KeyError:
+        defensive_rows[defending_types] = row = calculate_defensive_row(defending_types)
+        return row
 
 
 class StatChange:
@@ -79,6 +120,9 @@ class StatusCondition:
             self.condition = random.choice(self.multi)
 
 
+move_fields = ("name", "type", "category", "pp", "remaining_pp", "power", "accuracy", "priority", "contact", "target")
+
+
 class Move:
     def __init__(self, name: str, type: str | None, category: str, pp: int, power: int | str, accuracy: int, **kwargs):
         self.name = name
@@ -103,13 +147,13 @@ class Move:
         self.attributes = kwargs
 
     def __copy__(self):
-        return Move.from_json(self.json())
+        return self.clone()
 
     def __getitem__(self, item):
         return self.attributes.get(item)
 
     def __setitem__(self, key, value):
-        self.attributes[key] = value
+        self.attributes = self.attributes | {key: value}  # attributes may be shared with clones; don't modify in place
 
     def __str__(self):
         ret = [
@@ -125,9 +169,7 @@ class Move:
     def from_pack(name: str, remaining_pp: int = None):
         if remaining_pp == -1:
             remaining_pp = all_moves[name].pp
-        return Move.from_json(
-            all_moves[name].json() | ({"remaining_pp": remaining_pp} if remaining_pp is not None else {})
-        )
+        return all_moves[name].clone({"remaining_pp": remaining_pp} if remaining_pp is not None else {})
 
     def pack(self):
         return {"name": self.name} | ({"remaining_pp": self.remaining_pp} if self.remaining_pp != -1 else {})
@@ -144,10 +186,38 @@ class Move:
         }
 
     def base(self):
-        return find_move(self.name)
+        """The shared all_moves entry for this move. Don't modify it."""
+        return all_moves[self.name] if self.name in all_moves else find_move(self.name)
 
     def clone(self, overwrites: dict[str] = ()):
-        return Move.from_json(self.json() | {k: v for k, v in dict(overwrites).items() if k != "condition"})
+        """A copy-on-write clone: only remaining_pp and power should be changed on it directly."""
+        ret = object.__new__(Move)
+        ret.__dict__.update(self.__dict__)
+        attributes = {}
+        for k, v in (overwrites.items() if isinstance(overwrites, dict) else overwrites):
+            if k in move_fields:
+                setattr(ret, k, v)
+            elif k != "condition":
+                attributes[k] = v
+
+        if attributes:
+            ret.attributes = self.attributes | attributes
+            if "user_stat_changes" in attributes:
+                ret.user_stat_changes = StatChange.from_json(attributes["user_stat_changes"]) \
+                    if attributes["user_stat_changes"] else None
+            if "target_stat_changes" in attributes:
+                ret.target_stat_changes = StatChange.from_json(attributes["target_stat_changes"]) \
+                    if attributes["target_stat_changes"] else None
+            if "status" in attributes:
+                ret.status_condition = StatusCondition.from_json(attributes["status"]) if attributes["status"] else None
+            if "conditionals" in attributes:
+                ret.conditionals = attributes["conditionals"]
+
+        if ret.status_condition is self.status_condition and self.status_condition and self.status_condition.multi:
+            ret.status_condition = StatusCondition(  # e.g. Tri Attack picks a new condition each use
+                multi=self.status_condition.multi, chance=self.status_condition.chance
+            )
+        return ret
 
     def get(self, attribute: str, default_value=None):
         return self.attributes.get(attribute, default_value)
@@ -194,8 +264,12 @@ class Move:
         return (self.type == fire and self.category != status) or self["thaws_target"]
 
 
-all_moves = {g: Move.from_json(j) for g, j in json.load(open("data/moves.json", "r")).items()}
-fixed_moves = {fix(g): g for g in all_moves}
+def build_moves() -> tuple[dict[str, Move], dict[str, str]]:
+    moves = {g: Move.from_json(j) for g, j in load_json("moves.json").items()}
+    return moves, {fix(g): g for g in moves}
+
+
+all_moves, fixed_moves = cached("moves", ["moves.json"], __file__, build_moves)
 
 
 def find_move(s: str) -> Move:
@@ -0,0 +1,108 @@
+from teams import *
+from collections.abc import Iterator
+from typing import TextIO
+
+
+team_header = re.compile(r"=== (?:\[(?P<format>[^]]*)] )?(?P<name>.*?) ===")
+
+
+class PasteError(ValueError):
+    """A set that couldn't be parsed. Streaming readers collect these instead of raising them."""
+    def __init__(self, message: str, line_number: int, lines: list[str], team: str = None):
+        super().__init__(f"line {line_number}: {message}")
+        self.message = message
+        self.line_number = line_number
+        self.lines = lines
+        self.team = team
+
+
+def split_sets(lines: Iterable[str]) -> Iterator[tuple[int, str | None, int, list[str]]]:
+    """Splits a paste into sets, one line at a time, yielding (team number, team name, first line number, lines) for
+    each set. Sets are separated by blank lines, and teams by "=== [format] name ===" headers. Sets before the first
+    header are team 0, with no name."""
+    team_number, team = 0, None
+    start = 0
+    current = []
+    for n, line in enumerate(lines, 1):
+        line = line.rstrip()
+        if line and (match := team_header.fullmatch(line)):
+            if current:
+                yield team_number, team, start, current
+                current = []
+            team_number, team = team_number + 1, match.group("name")
+        elif line:
+            if not current:
+                start = n
+            current.append(line)
+        elif current:
+            yield team_number, team, start, current
+            current = []
+    if current:
+        yield team_number, team, start, current
+
+
+def parse_set(lines: list[str], line_number: int = 1, team: str = None) -> MiniMon:
+    kwargs = MiniMon.pokepaste_kwargs(lines)
+    if "species_and_form" not in kwargs:
+        raise PasteError("no species line", line_number, lines, team)
+    try:
+        return MiniMon(**kwargs)
+    except (KeyError, ValueError) as e:
+        raise PasteError(f"invalid set for {kwargs['species_and_form']} ({e})", line_number, lines, team) from e
+
+
+def read_sets(lines: Iterable[str], errors: list[PasteError] = None, packs: bool = False) \
+        -> Iterator[MiniMon | dict]:
+    """Streams the sets in a paste, which can be any iterable of lines (e.g. an open file), so memory use doesn't grow
+    with its length. Yields MiniMons, or their mini packs if packs is True. Sets that can't be parsed are skipped, and
+    appended to errors if it's given."""
+    for _, team, start, current in split_sets(lines):
+        try:
+            mon = parse_set(current, start, team)
+        except PasteError as e:
+            if errors is not None:
+                errors.append(e)
+            continue
+        yield mon.mini_pack() if packs else mon
+
+
+def read_teams(lines: Iterable[str], errors: list[PasteError] = None, packs: bool = False, size: int = 6) \
+        -> Iterator[Team | dict]:
+    """Streams the teams in a paste, split by their "=== [format] name ===" headers. Sets before the first header are
+    grouped into a single unnamed team. Yields Teams, or Team.from_json()-compatible dicts if packs is True.
+    Sets that can't be parsed are skipped, and appended to errors if it's given; the rest of their team is kept."""
+    def finish():
+        if packs:
+            return {"trainer": name or "Trainer", "mons": mons[:size]} | ({"size": size} if size != 6 else {})
+        return Team(mons, trainer=name or "Trainer", size=size)
+
+    number, name, mons = None, None, []
+    for team_number, team, start, current in split_sets(lines):
+        if team_number != number:
+            if number is not None:
+                yield finish()
+            number, name, mons = team_number, team, []
+        try:
+            mon = parse_set(current, start, team)
+        except PasteError as e:
+            if errors is not None:
+                errors.append(e)
+            continue
+        mons.append(mon.mini_pack() if packs else mon)
+    if number is not None:
+        yield finish()
+
+
+def write_sets(mons: Iterable[MiniMon | dict], file: TextIO):
+    """Writes sets to a file, one at a time. Mini packs are accepted as well as mons."""
+    for n, mon in enumerate(mons):
+        if isinstance(mon, dict):
+            mon = MiniMon.from_mini_pack(mon)
+        file.write(("\n" if n else "") + mon.pokepaste() + "\n")
+
+
+def write_teams(teams: Iterable[Team], file: TextIO, format_name: str = None):
+    """Writes teams to a file in the same format read_teams() reads, with a header for each."""
+    for n, team in enumerate(teams):
+        file.write(("\n" if n else "") + f"=== {f'[{format_name}] ' if format_name else ''}{team.trainer} ===\n\n")
+        write_sets(team.ordered_mons, file)
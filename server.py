@@ -0,0 +1,426 @@
+from battlelog import *
+from pokepaste import *
+from collections import deque
+import argparse
+import asyncio
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class Abandoned(Exception):
+    """Raised in a battle's task when one side has disconnected or stopped responding."""
+    def __init__(self, side: int):
+        super().__init__(f"side {side} abandoned the battle")
+        self.side = side
+
+
+class TurnLog:
+    """A Battle log that keeps the events since the last flush, so they can be rendered for each side in turn."""
+
+    def __init__(self):
+        self.events = []
+        self.views = []
+
+    def begin(self, battle: Battle):
+        team_packs = [team_pack(g) for g in battle.teams]
+        self.views = [LoggedBattle(battle.size, n, team_packs, self.events) for n in range(2)]
+
+    def event(self, name: str, args: tuple):
+        self.events.append((name, args))
+
+    def finish(self):
+        pass
+
+    def lines(self, side: int) -> list[str]:
+        return list(self.views[side].lines()) if self.views else []
+
+
+class Client:
+    """A connection to the server. Messages are JSON objects, one per line, in both directions."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.battles = set()
+
+    def send(self, message: dict):
+        if not self.writer.is_closing():
+            self.writer.write(json.dumps(message).encode("utf-8") + b"\n")
+
+
+class RemoteController(BasicAI):
+    """A side played by a client. Each turn, it sends the client its state and options, then waits up to the server's
+    turn timeout for actions in the same (next_action, targets) terms as Controller.options(). If none come in time,
+    BasicAI picks for it; too many timeouts in a row, or disconnecting, forfeits the battle."""
+
+    def __init__(self, mons: list[MiniMon] = (), **kwargs):
+        super().__init__(mons, **kwargs)
+        self.client = kwargs.get("client")
+        self.hosted = kwargs.get("hosted")
+        self.pending = None  # future for the client's answer, while waiting for one
+        self.pending_kind = None
+        self.timeouts = 0
+        self.abandoned = False
+
+    def state(self) -> dict:
+        return {
+            "battle": self.hosted.id, "side": self.id, "turn": self.hosted.battle.turn_count,
+            "mons": [
+                {
+                    "id": g.id, "name": g.name, "species": g.species_and_form, "position": g.position,
+                    "hp": g.remaining_hp, "max_hp": g.hp, "status": g.status_condition, "fainted": g.fainted,
+                    "moves": {k: v.remaining_pp for k, v in g.moves.items()}
+                } for g in self.mons.values()
+            ],
+            "opponents": [
+                {
+                    "position": g.position, "name": g.name, "species": g.species_and_form,
+                    "hp_percent": round(100 * g.remaining_hp / g.hp), "status": g.status_condition
+                } for g in self.opponent_mons
+            ]
+        }
+
+    async def wait_for(self, kind: str, message: dict):
+        if self.abandoned:
+            raise Abandoned(self.id)
+        self.pending = asyncio.get_running_loop().create_future()
+        self.pending_kind = kind
+        self.client.send(message)
+        try:
+            ret = await asyncio.wait_for(self.pending, self.hosted.server.turn_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            if self.timeouts >= self.hosted.server.max_timeouts:
+                raise Abandoned(self.id)
+            self.client.send({"op": "timeout", "battle": self.hosted.id, "side": self.id, "kind": kind})
+            return None
+        finally:
+            self.pending = self.pending_kind = None
+        self.timeouts = 0
+        return ret
+
+    async def set_actions_async(self):
+        mons = [g for g in self.fielded_mons if not g.fainted]
+        options = {g.position: self.options(g) for g in mons}
+        joint = await self.wait_for("actions", {"op": "request"} | self.state() | {
+            "options": {str(k): [[a, list(t)] for a, t in v] for k, v in options.items()}
+        })
+        if joint is None:
+            self.set_actions()
+        else:
+            self.apply_actions(joint)
+
+    async def get_replacement_async(self, position: int) -> int:
+        replacement = await self.wait_for("replacement", {"op": "replace"} | self.state() | {
+            "position": position, "options": [g.id for g in self.reserves]
+        })
+        return self.get_replacement(position) if replacement is None else replacement
+
+    def parse_actions(self, actions: list[dict]) -> tuple:
+        """Checks a client's actions against options() and returns them in apply_actions() form."""
+        try:
+            given = {
+                int(g["position"]): (g["next_action"], tuple(int(j) for j in g.get("targets", ()))) for g in actions
+            }
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("actions must be a list of {position, next_action, targets}")
+        joint, switches = [], set()
+        for mon in self.fielded_mons:
+            if mon.fainted:
+                continue
+            if not (options := self.options(mon)):  # nothing it can do, as in BasicAI
+                joint.append((mon.position, ("!unplugged", ())))
+                continue
+            if mon.position not in given:
+                raise ValueError(f"no action for position {mon.position}")
+            if given[mon.position] not in options:
+                raise ValueError(f"invalid action for position {mon.position}: {list(given[mon.position])}")
+            if given[mon.position][0] == "!switch":
+                if given[mon.position][1] in switches:
+                    raise ValueError("two mons can't switch to the same reserve")
+                switches.add(given[mon.position][1])
+            joint.append((mon.position, given[mon.position]))
+        return tuple(joint)
+
+    def submit(self, kind: str, value):
+        if self.pending is None or self.pending.done() or self.pending_kind != kind:
+            raise ValueError(f"not waiting for {kind}")
+        if kind == "actions":
+            value = self.parse_actions(value)
+        elif value not in [g.id for g in self.reserves]:
+            raise ValueError(f"invalid replacement: {value}")
+        self.pending.set_result(value)
+
+    def abandon(self):
+        self.abandoned = True
+        if self.pending is not None and not self.pending.done():
+            self.pending.set_exception(Abandoned(self.id))
+
+
+class HostedBattle:
+    """A battle on the server: waiting for its second player until it has one, then running as a task."""
+
+    def __init__(self, server: "BattleServer", id_no: int, size: int, sides: list):
+        self.server = server
+        self.id = id_no
+        self.size = size
+        self.sides = sides  # controllers; a side is None until someone joins it
+        self.clients = {}  # side: Client
+        self.log = TurnLog()
+        self.battle = None
+        self.task = None
+        self.expiry = None  # handle that removes the battle if nobody joins it in time
+
+    def flush(self):
+        for side, client in self.clients.items():
+            if lines := self.log.lines(side):
+                client.send({"op": "output", "battle": self.id, "side": side, "lines": lines})
+        self.log.events.clear()
+
+    def send(self, message: dict):
+        for client in set(self.clients.values()):
+            client.send(message)
+
+    async def play(self):
+        battle = self.battle
+        winner, reason = None, "turn limit"
+        try:
+            battle.init_battle()
+            self.flush()
+            while battle.turn_count < self.server.max_turns:
+                battle.start_turn()
+                self.flush()
+                await asyncio.gather(*(g.set_actions_async() for g in battle.teams))
+                start = time.perf_counter()
+                done = battle.resolve_turn(send_out=False)
+                self.server.record_turn(time.perf_counter() - start)
+                self.flush()
+                if done:
+                    winner, reason = battle.check_winner(), "win"
+                    break
+                await battle.send_out_replacements_async()
+                self.flush()
+        except Abandoned as e:
+            winner, reason = 1 - e.side, "abandoned"
+        except Exception:
+            logger.exception(f"Battle {self.id} crashed")
+            winner, reason = None, "error"
+        finally:
+            for team in battle.teams:  # stop the other side waiting, if it still is
+                if isinstance(team, RemoteController):
+                    team.abandon()
+            self.server.finish(self, winner, reason)
+
+
+class BattleServer:
+    """Hosts any number of simultaneous battles for clients on a local TCP socket, speaking JSON lines. Requests:
+
+    {"op": "create", "size": 1, "team": [mini packs] or "paste": "...", "trainer": "...", "opponent": "client" or "ai"}
+        starts a battle, against a BasicAI (given "opponent_team"/"opponent_paste", or a mirror match) or waiting for
+        another client to join it
+    {"op": "join", "battle": id, "team" or "paste", "trainer"}
+    {"op": "actions", "battle": id, "actions": [{"position": 0, "next_action": "Earthquake", "targets": [1]}, ...]}
+        answers a "request", using one of its options for each position
+    {"op": "replacement", "battle": id, "id": mon id}
+        answers a "replace" with one of its options
+    {"op": "metrics"}
+        active battles, turns/second over the last minute and overall, and turn latency
+
+    The server sends "created", "joined", "start", "request", "replace", "output", "timeout", "end" and "error"
+    messages, each with the battle's id."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, turn_timeout: float = 60.0,
+                 join_timeout: float = 300.0, max_timeouts: int = 3, max_turns: int = 500):
+        self.host = host
+        self.port = port
+        self.turn_timeout = turn_timeout
+        self.join_timeout = join_timeout
+        self.max_timeouts = max_timeouts
+        self.max_turns = max_turns
+        self.battles = {}
+        self.next_id = 1
+        self.finished = 0
+        self.turns = 0
+        self.turn_times = deque()  # when each turn in the last rate_window seconds finished, for turns/second
+        self.rate_window = 60.0
+        self.latencies = deque(maxlen=1000)  # how long recent turns took to resolve, for p99 latency
+        self.started = time.monotonic()
+        self.server = None
+
+    async def start(self) -> asyncio.Server:
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]  # in case port 0 picked a free one
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def record_turn(self, latency: float):
+        now = time.monotonic()
+        self.turns += 1
+        self.turn_times.append(now)
+        self.latencies.append(latency)
+        self.trim_turn_times(now)
+
+    def trim_turn_times(self, now: float):
+        while self.turn_times and self.turn_times[0] < now - self.rate_window:
+            self.turn_times.popleft()
+
+    def metrics(self) -> dict:
+        """turns_per_second is over the last rate_window seconds (or since the server started, if that's sooner), and
+        turns_per_second_overall is over the whole uptime."""
+        now = time.monotonic()
+        self.trim_turn_times(now)
+        uptime = max(now - self.started, 1e-9)
+        latencies = sorted(self.latencies)
+        return {
+            "active_battles": sum(g.task is not None for g in self.battles.values()),
+            "waiting_battles": sum(g.task is None for g in self.battles.values()),
+            "finished_battles": self.finished, "turns": self.turns,
+            "turns_per_second": len(self.turn_times) / min(self.rate_window, uptime),
+            "turns_per_second_overall": self.turns / uptime,
+            "p99_turn_latency_ms": 1e3 * latencies[ceil(0.99 * len(latencies)) - 1] if latencies else None,
+            "uptime": uptime
+        }
+
+    @staticmethod
+    def parse_team(message: dict, prefix: str = "") -> list[MiniMon]:
+        if isinstance(message.get(f"{prefix}paste"), str):
+            errors = []
+            mons = list(read_sets(message[f"{prefix}paste"].splitlines(), errors))
+            if errors:
+                raise ValueError(str(errors[0]))
+        elif isinstance(message.get(f"{prefix}team"), list):
+            try:
+                mons = [MiniMon.from_mini_pack(g) for g in message[f"{prefix}team"]]
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"invalid mini pack ({e})")
+        else:
+            raise ValueError(f"{prefix}team or {prefix}paste is required")
+        if not mons:
+            raise ValueError("the team is empty")
+        return mons
+
+    def battle(self, message: dict) -> HostedBattle:
+        if not isinstance(message.get("battle"), (str, int)):
+            raise ValueError("battle must be a battle id")
+        if (hosted := self.battles.get(message.get("battle"))) is None:
+            raise ValueError(f"no battle {message.get('battle')}")
+        return hosted
+
+    def create(self, client: Client, message: dict):
+        size = message.get("size", 1)
+        if size not in (1, 2, 3):
+            raise ValueError("size must be 1, 2 or 3")
+        mons = self.parse_team(message)
+        hosted = HostedBattle(self, self.next_id, size, [None, None])
+        self.next_id += 1
+        hosted.sides[0] = RemoteController(
+            mons, trainer=message.get("trainer", "Player 1"), client=client, hosted=hosted
+        )
+        hosted.clients[0] = client
+        if message.get("opponent", "client") == "ai":
+            opponent = self.parse_team(message, "opponent_") \
+                if "opponent_team" in message or "opponent_paste" in message else mons
+            hosted.sides[1] = BasicAI(opponent, trainer=message.get("opponent_trainer", "AI"))
+        self.battles[hosted.id] = hosted
+        client.battles.add(hosted)
+        client.send({"op": "created", "battle": hosted.id, "side": 0})
+        if hosted.sides[1] is None:
+            hosted.expiry = asyncio.get_running_loop().call_later(self.join_timeout, self.expire, hosted)
+        else:
+            self.begin(hosted)
+
+    def join(self, client: Client, message: dict):
+        hosted = self.battle(message)
+        if hosted.sides[1] is not None:
+            raise ValueError(f"battle {hosted.id} is full")
+        mons = self.parse_team(message)
+        hosted.sides[1] = RemoteController(
+            mons, trainer=message.get("trainer", "Player 2"), client=client, hosted=hosted
+        )
+        hosted.clients[1] = client
+        client.battles.add(hosted)
+        client.send({"op": "joined", "battle": hosted.id, "side": 1})
+        hosted.expiry.cancel()
+        self.begin(hosted)
+
+    def begin(self, hosted: HostedBattle):
+        hosted.battle = Battle(hosted.sides, hosted.size, sink=NullSink(), log=hosted.log)
+        hosted.send({"op": "start", "battle": hosted.id, "trainers": [g.trainer for g in hosted.sides]})
+        hosted.task = asyncio.create_task(hosted.play())
+
+    def expire(self, hosted: HostedBattle):
+        if hosted.task is None and self.battles.pop(hosted.id, None) is not None:
+            hosted.send({"op": "end", "battle": hosted.id, "winner": None, "reason": "nobody joined"})
+            for client in hosted.clients.values():
+                client.battles.discard(hosted)
+
+    def finish(self, hosted: HostedBattle, winner: int | None, reason: str):
+        if self.battles.pop(hosted.id, None) is not None:
+            self.finished += 1
+            hosted.send({"op": "end", "battle": hosted.id, "winner": winner, "reason": reason})
+            for client in hosted.clients.values():
+                client.battles.discard(hosted)
+
+    def handle(self, client: Client, message: dict):
+        op = message.get("op")
+        if op == "create":
+            self.create(client, message)
+        elif op == "join":
+            self.join(client, message)
+        elif op in ("actions", "replacement"):
+            hosted = self.battle(message)
+            sides = [  # a client playing both sides says which one it means
+                k for k, v in hosted.clients.items()
+                if v is client and hosted.sides[k].pending_kind == op and message.get("side", k) == k
+            ]
+            if not sides:
+                raise ValueError(f"battle {hosted.id} isn't waiting for your {op}")
+            hosted.sides[sides[0]].submit(op, message.get("actions") if op == "actions" else message.get("id"))
+        elif op == "metrics":
+            client.send({"op": "metrics"} | self.metrics())
+        else:
+            raise ValueError(f"unknown op: {op}")
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = Client(writer)
+        try:
+            while line := await reader.readline():
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError("messages must be JSON objects")
+                    self.handle(client, message)
+                except (KeyError, TypeError, ValueError) as e:  # includes JSON errors; one bad message isn't fatal
+                    client.send({"op": "error", "message": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:  # abandon everything this client was part of
+            for hosted in list(client.battles):
+                if hosted.task is None:
+                    hosted.expiry.cancel()
+                    self.battles.pop(hosted.id, None)
+                else:
+                    for side, other in hosted.clients.items():
+                        if other is client:
+                            hosted.sides[side].abandon()
+            writer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hosts battles for clients on a local TCP socket, in JSON lines.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--turn-timeout", type=float, default=60.0, help="seconds each side has to choose")
+    parser.add_argument("--join-timeout", type=float, default=300.0, help="seconds a battle waits for a second player")
+    parser.add_argument("--max-turns", type=int, default=500)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(BattleServer(
+        args.host, args.port, args.turn_timeout, args.join_timeout, max_turns=args.max_turns
+    ).serve_forever())
@@ -0,0 +1,77 @@
+import time
+from typing import Callable, TextIO
+
+
+class OutputSink:
+    """Receives the text output of a Battle. The base class discards everything."""
+    wants_diagrams = False  # whether the per-turn field summary and diagram should be built for this sink
+
+    def write(self, text: str, sleep_time: float = 0) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class NullSink(OutputSink):
+    """Discards all output. Used for headless battles."""
+
+
+class ConsoleSink(OutputSink):
+    """Prints output to the console, pausing after each line if sleep is True. The default for a Battle."""
+    wants_diagrams = True
+
+    def __init__(self, sleep: bool = True):
+        self.sleep = sleep
+
+    def write(self, text: str, sleep_time: float = 0) -> None:
+        print(text)
+        if self.sleep and sleep_time:
+            time.sleep(sleep_time)
+
+
+class BufferSink(OutputSink):
+    """Keeps output in memory as a list of lines."""
+
+    def __init__(self, wants_diagrams: bool = True):
+        self.wants_diagrams = wants_diagrams
+        self.lines = []
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    def write(self, text: str, sleep_time: float = 0) -> None:
+        self.lines.append(text)
+
+    def clear(self) -> None:
+        self.lines = []
+
+
+class FileSink(OutputSink):
+    """Writes output to a file, given either as a path or as an open text file."""
+
+    def __init__(self, file: str | TextIO, wants_diagrams: bool = True):
+        self.wants_diagrams = wants_diagrams
+        self.owns_file = isinstance(file, str)
+        self.file = open(file, "w", encoding="utf-8") if self.owns_file else file
+
+    def write(self, text: str, sleep_time: float = 0) -> None:
+        self.file.write(text + "\n")
+
+    def close(self) -> None:
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class CallbackSink(OutputSink):
+    """Passes each piece of output to a callback."""
+
+    def __init__(self, callback: Callable[[str], None], wants_diagrams: bool = True):
+        self.wants_diagrams = wants_diagrams
+        self.callback = callback
+
+    def write(self, text: str, sleep_time: float = 0) -> None:
+        self.callback(text)
@@ -0,0 +1,104 @@
+from mons import *
+from bisect import bisect_left, bisect_right
+import argparse
+
+
+speed_levels = (50, 100)
+# EVs, IVs, and nature (+1 boosting Speed, -1 lowering it), named the way damage calcs write them; "0-" is the
+# slowest a mon can be, with 0 IVs, for Trick Room
+speed_profiles = {"252+": (252, 31, 1), "252": (252, 31, 0), "0": (0, 31, 0), "0-": (0, 0, -1)}
+speed_stages = range(-6, 7)
+# the multipliers Field.get_stat() applies to Speed, by name; None is no modifier
+speed_modifiers = {None: (), "paralysis": (0.5, )}
+
+
+def profile_speed(base: int, level: int, profile: str) -> int:
+    """A mon's Speed stat with a speed profile, as MiniMon.calculate_stats() works it out."""
+    ev, iv, nature = speed_profiles[profile]
+    return floor((floor((2 * base + iv + floor(ev / 4)) * level / 100) + 5) * (1 + 0.1 * nature))
+
+
+def final_speed(speed: int, stage: int = 0, modifier: str = None) -> int:
+    """A Speed stat after a stage and modifier, as Field.get_stat() works it out."""
+    staged = round(speed * (2 + max(stage, 0)) / (2 - min(stage, 0)))
+    return max(1, round(staged * product(speed_modifiers[modifier])))
+
+
+def build_speed_tiers() -> dict[tuple[int, int, str | None], list[tuple[int, str, str]]]:
+    ret = {}
+    for species in all_species.values():
+        for form in species.forms.values():
+            name = MiniMon(species=species, form=form).species_and_form
+            for level in speed_levels:
+                for profile in speed_profiles:
+                    speed = profile_speed(form.spe, level, profile)
+                    for stage in speed_stages:
+                        for modifier in speed_modifiers:
+                            ret.setdefault((level, stage, modifier), []).append(
+                                (final_speed(speed, stage, modifier), name, profile)
+                            )
+    for tier in ret.values():
+        tier.sort()
+    return ret
+
+
+class SpeedTiers:
+    """Final Speed for every species and form, with every speed profile, at each of speed_levels, speed_stages and
+    speed_modifiers. Each (level, stage, modifier) tier is a list of (speed, species and form, profile) sorted by
+    speed, so finding who moves before or after a given speed is a binary search."""
+
+    def __init__(self, tiers: dict[tuple[int, int, str | None], list[tuple[int, str, str]]]):
+        self.tiers = tiers
+        self.speeds = {k: [g[0] for g in v] for k, v in tiers.items()}
+
+    def tier(self, level: int = 50, stage: int = 0, modifier: str = None) -> list[tuple[int, str, str]]:
+        if (level, stage, modifier) not in self.tiers:
+            raise KeyError(f"No speed tier for level {level}, stage {stage:+}, modifier {modifier}.")
+        return self.tiers[level, stage, modifier]
+
+    @staticmethod
+    def speed(species_and_form: str, profile: str = "252+", level: int = 50, stage: int = 0,
+              modifier: str = None) -> int:
+        """Final Speed of a species or form with a profile. Works at any level, not just the indexed ones."""
+        return final_speed(profile_speed(MiniMon(species_and_form).form.spe, level, profile), stage, modifier)
+
+    def moves_before(self, speed: int, level: int = 50, stage: int = 0, modifier: str = None,
+                     trick_room: bool = False) -> list[tuple[int, str, str]]:
+        """The entries of a tier that move before a mon with the given final Speed: faster ones, or under Trick Room,
+        slower ones. Fastest (or slowest) first; ties aren't included, since they move first half the time."""
+        tier = self.tier(level, stage, modifier)
+        if trick_room:
+            return tier[:bisect_left(self.speeds[level, stage, modifier], speed)]
+        return tier[bisect_right(self.speeds[level, stage, modifier], speed):][::-1]
+
+    def moves_after(self, speed: int, level: int = 50, stage: int = 0, modifier: str = None,
+                    trick_room: bool = False) -> list[tuple[int, str, str]]:
+        return self.moves_before(speed, level, stage, modifier, not trick_room)
+
+    def ties(self, speed: int, level: int = 50, stage: int = 0, modifier: str = None) -> list[tuple[int, str, str]]:
+        speeds = self.speeds[level, stage, modifier]
+        return self.tier(level, stage, modifier)[bisect_left(speeds, speed):bisect_right(speeds, speed)]
+
+
+speed_tiers = SpeedTiers(cached("speed_tiers", ["mons.json"], __file__, build_speed_tiers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lists the species and forms that move before a mon.")
+    parser.add_argument("mon", help="species or form, e.g. Garchomp")
+    parser.add_argument("--profile", default="252+", choices=speed_profiles)
+    parser.add_argument("--level", type=int, default=50, choices=speed_levels)
+    parser.add_argument("--stage", type=int, default=0, help="the mon's Speed stage")
+    parser.add_argument("--paralyzed", action="store_true", help="if the mon is paralyzed")
+    parser.add_argument("--against-stage", type=int, default=0, help="the other mons' Speed stage")
+    parser.add_argument("--against-paralyzed", action="store_true", help="if the other mons are paralyzed")
+    parser.add_argument("--trick-room", action="store_true")
+    args = parser.parse_args()
+
+    target = speed_tiers.speed(args.mon, args.profile, args.level, args.stage, "paralysis" if args.paralyzed else None)
+    against = (args.level, args.against_stage, "paralysis" if args.against_paralyzed else None)
+    print(f"{args.mon} ({args.profile}, {args.stage:+}): {target} Speed")
+    for speed, name, profile in speed_tiers.moves_before(target, *against, args.trick_room):
+        print(f"{speed:>4} {name} ({profile})")
+    if ties := speed_tiers.ties(target, *against):
+        print(f"Ties: {', '.join(f'{name} ({profile})' for _, name, profile in ties)}")
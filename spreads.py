@@ -0,0 +1,275 @@
+from damagecalc import *
+from itertools import product as cartesian_product
+
+
+ev_steps = np.arange(0, 253, 4) if np is not None else None  # every EV amount worth giving a stat
+max_ev_steps = 510 // 4  # the 510 EV cap, in steps of 4
+# one of each stat-changing nature, plus a single neutral one, since the five neutral natures give identical stats
+spread_natures = [g for n, g in enumerate(nature_table) if n // 5 != n % 5] + ["Hardy"]
+
+
+def stat_table(mon: MiniMon, natures: list[str] = None):
+    """Vectorized MiniMon.calculate_stats(): a (natures, 6, 64) array of each stat for each nature and each EV amount
+    from 0 to 252 in steps of 4, at the mon's level and IVs. Matches calculate_stats() exactly, rounding and all."""
+    require_numpy()
+    natures = spread_natures if natures is None else natures
+    form, level, ivs = mon.form, mon.level, mon.ivs
+    bases = np.array([form.hp, form.atk, form.dfn, form.spa, form.spd, form.spe])[:, None]
+    inner = np.floor((2 * bases + np.array(ivs)[:, None] + ev_steps // 4) * level / 100)
+
+    indices = np.array([nature_table.index(g) for g in natures])[:, None]
+    stats = np.arange(5)[None, :]
+    modifiers = 1 + 0.1 * ((indices // 5 == stats).astype(int) - (indices % 5 == stats))
+
+    ret = np.empty((len(natures), 6, len(ev_steps)), dtype=int)
+    ret[:, 0] = 1 if mon.species.name == "Shedinja" else inner[0] + level + 10
+    ret[:, 1:] = np.floor((inner[None, 1:] + 5) * modifiers[:, :, None])
+    return ret
+
+
+def batch_stat(stats, stage: int, multipliers: list[float], ignore_stage: bool = False):
+    """Vectorized Field.get_stat() over an array of a stat's values, given its stage and field multipliers."""
+    staged = stats if ignore_stage else np.round(stats * (2 + max(stage, 0)) / (2 - min(stage, 0)))
+    return np.maximum(1, np.round(staged * product(multipliers)))
+
+
+def batch_damage(level: int, attacking_stats, defending_stats, move: Move, multiplier: float):
+    """Vectorized Field.damage_roll() for a single roll, given the product of every multiplier besides the stats."""
+    if move["exact_damage"]:
+        return np.full(np.broadcast(attacking_stats, defending_stats).shape, move["exact_damage"])
+    raw = batch_raw_damage(level, attacking_stats, defending_stats, move.power)
+    return raw if move["unmodified_damage"] else np.maximum(1, np.round(raw * multiplier))
+
+
+def matchup_field(mon: FieldMon, opponent: FieldMon, weather: str = None, screen: bool = False) -> Field:
+    """A singles field holding a mon and an opponent, for constraints to read multipliers from. screen sets Reflect
+    and Light Screen on the mon's side."""
+    field = Field()
+    mon.team_id, mon.position = 0, 0
+    opponent.team_id, opponent.position = 1, 1
+    field.deploy_mon(mon, 0)
+    field.deploy_mon(opponent, 1)
+    field.set_weather(weather)
+    if screen:
+        field.side(mon).set_reflect()
+        field.side(mon).set_light_screen()
+    return field
+
+
+def opponent_mon(opponent: MiniMon | FieldMon, stat: str = None, stage: int = 0) -> FieldMon:
+    """A copy of an opponent to deploy in a matchup field. A FieldMon keeps its stages and status, and a MiniMon gets
+    the given stage in the given stat."""
+    if isinstance(opponent, FieldMon):
+        ret = FieldMon.from_json(opponent.json())
+        ret.load_state(opponent.save_state())  # json() leaves out stages and other volatile state
+        return ret
+    ret = opponent.deploy()
+    if stat:
+        ret.stat_stages[stat] = stage
+    return ret
+
+
+class SpreadConstraint:
+    """Something a spread has to do, in terms of some of its stats. prepare() is called once with the mon being
+    optimized, then check() with stat_table(); it returns a bool array of whether each nature (first axis) and EV
+    amount in each of self.stats (one axis each, in that order) meets the constraint."""
+    stats = ()
+
+    def prepare(self, mon: MiniMon):
+        pass
+
+    def check(self, table):
+        raise NotImplementedError
+
+
+class Outspeed(SpreadConstraint):
+    """Moves before a target: outspeeds it, or underspeeds it under Trick Room. A speed tie counts only if tie is True.
+    stage and paralyzed apply to the mon being optimized; target_stage to the target, unless it's a FieldMon."""
+    stats = ("Spe", )
+
+    def __init__(self, target: MiniMon | FieldMon, stage: int = 0, target_stage: int = 0, paralyzed: bool = False,
+                 trick_room: bool = False, tie: bool = False):
+        self.target = target
+        self.stage = stage
+        self.target_stage = target_stage
+        self.paralyzed = paralyzed
+        self.trick_room = trick_room
+        self.tie = tie
+        self.target_speed = self.multipliers = None
+
+    def prepare(self, mon: MiniMon):
+        mon = mon.deploy(status_condition=paralysis if self.paralyzed else None)
+        target = opponent_mon(self.target, "Spe", self.target_stage)
+        field = matchup_field(mon, target)
+        self.target_speed = field.get_stat(target, "Spe")
+        self.multipliers = field.stat_multipliers(mon, "Spe")
+
+    def check(self, table):
+        speed = batch_stat(table[:, six_stats.index("Spe")], self.stage, self.multipliers)
+        if self.trick_room:
+            return speed <= self.target_speed if self.tie else speed < self.target_speed
+        return speed >= self.target_speed if self.tie else speed > self.target_speed
+
+
+class Survive(SpreadConstraint):
+    """Survives hits of an attacker's move at the given roll (100 being the highest, so every roll), from full HP.
+    stage applies to the mon being optimized; attacker_stage to the move's attacking stat, unless it's a FieldMon."""
+
+    def __init__(self, attacker: MiniMon | FieldMon, move: str | Move, hits: int = 1, roll: int = 100,
+                 crit: bool = False, stage: int = 0, attacker_stage: int = 0, weather: str = None,
+                 screen: bool = False):
+        self.attacker = attacker
+        self.move = move if isinstance(move, Move) else Move.from_pack(move, -1)
+        if self.move["use_target_offense"]:
+            raise ValueError(f"{self.move.name} uses the defender's stats, which Survive doesn't support.")
+        self.hits = hits
+        self.roll = roll
+        self.crit = crit or bool(self.move.get("always_crits", False))
+        self.stage = stage
+        self.attacker_stage = attacker_stage
+        self.weather = weather
+        self.screen = screen
+        self.stats = ("HP", self.move.defending_stat)
+        self.level = self.attack_stat = self.multiplier = self.multipliers = None
+
+    def prepare(self, mon: MiniMon):
+        mon = mon.deploy()
+        mon.stat_stages[self.move.defending_stat] = self.stage
+        attacker = opponent_mon(self.attacker, self.move.attacking_stat, self.attacker_stage)
+        field = matchup_field(mon, attacker, self.weather, self.screen)
+        self.level = attacker.level
+        self.attack_stat = field.get_stat(attacker, self.move.attacking_stat, ignore_negative_stages=self.crit)
+        self.multipliers = field.stat_multipliers(mon, self.move.defending_stat)
+        self.multiplier = damage_multiplier(
+            product(field.pre_roll_multipliers(attacker, mon, self.move, self.crit, False)), self.roll / 100,
+            field.move_effectiveness(attacker, mon, self.move), field.stab(attacker, self.move)
+        )
+
+    def check(self, table):
+        defense = batch_stat(
+            table[:, six_stats.index(self.move.defending_stat)], self.stage, self.multipliers,
+            self.crit and self.stage > 0
+        )
+        damage = batch_damage(self.level, self.attack_stat, defense, self.move, self.multiplier)
+        return table[:, 0, :, None] > self.hits * damage[:, None, :]
+
+
+class KnockOut(SpreadConstraint):
+    """KOs a target from full HP (or its remaining HP, if it's a FieldMon) in the given number of hits at the given
+    roll (85 being the lowest, so every roll). stage applies to the mon's attacking stat; target_stage to the move's
+    defending stat, unless the target's a FieldMon."""
+
+    def __init__(self, target: MiniMon | FieldMon, move: str | Move, hits: int = 1, roll: int = 85,
+                 crit: bool = False, stage: int = 0, target_stage: int = 0, weather: str = None,
+                 screen: bool = False):
+        self.target = target
+        self.move = move if isinstance(move, Move) else Move.from_pack(move, -1)
+        if self.move["use_target_offense"]:
+            raise ValueError(f"{self.move.name} uses the defender's stats, which KnockOut doesn't support.")
+        self.hits = hits
+        self.roll = roll
+        self.crit = crit or bool(self.move.get("always_crits", False))
+        self.stage = stage
+        self.target_stage = target_stage
+        self.weather = weather
+        self.screen = screen
+        self.stats = (self.move.attacking_stat, )
+        self.level = self.target_hp = self.defense_stat = self.multiplier = self.multipliers = None
+
+    def prepare(self, mon: MiniMon):
+        self.level = mon.level
+        mon = mon.deploy()
+        mon.stat_stages[self.move.attacking_stat] = self.stage
+        target = opponent_mon(self.target, self.move.defending_stat, self.target_stage)
+        field = matchup_field(target, mon, self.weather, self.screen)
+        self.target_hp = target.remaining_hp
+        self.defense_stat = field.get_stat(target, self.move.defending_stat, ignore_positive_stages=self.crit)
+        self.multipliers = field.stat_multipliers(mon, self.move.attacking_stat)
+        self.multiplier = damage_multiplier(
+            product(field.pre_roll_multipliers(mon, target, self.move, self.crit, False)), self.roll / 100,
+            field.move_effectiveness(mon, target, self.move), field.stab(mon, self.move)
+        )
+
+    def check(self, table):
+        attack = batch_stat(
+            table[:, six_stats.index(self.move.attacking_stat)], self.stage, self.multipliers,
+            self.crit and self.stage < 0
+        )
+        return self.hits * batch_damage(self.level, attack, self.defense_stat, self.move, self.multiplier) >= \
+            self.target_hp
+
+
+def constraint_groups(constraints: list[SpreadConstraint]) -> list[tuple[tuple[str, ...], list[SpreadConstraint]]]:
+    """Splits constraints into groups that share no stats, so each group's stats can be searched separately."""
+    groups = []
+    for constraint in constraints:
+        stats, members = set(constraint.stats), [constraint]
+        for group in [g for g in groups if g[0] & stats]:
+            groups.remove(group)
+            stats |= group[0]
+            members = group[1] + members
+        groups.append((stats, members))
+    return [(tuple(g for g in six_stats if g in stats), members) for stats, members in groups]
+
+
+def minimal_points(feasible):
+    """Of the True points in a bool array (past its first axis), the ones with no other True point at or below them in
+    every coordinate."""
+    below = feasible
+    for axis in range(1, feasible.ndim):
+        below = np.logical_or.accumulate(below, axis=axis)
+    dominated = np.zeros_like(feasible)
+    for axis in range(1, feasible.ndim):
+        index = [slice(None)] * feasible.ndim
+        index[axis] = slice(1, None)
+        shifted = [slice(None)] * feasible.ndim
+        shifted[axis] = slice(None, -1)
+        dominated[tuple(index)] |= below[tuple(shifted)]
+    return feasible & ~dominated
+
+
+def optimize_spread(mon: MiniMon, constraints: list[SpreadConstraint], natures: list[str] = None,
+                    limit: int = None) -> list[dict[str]]:
+    """Every Pareto-optimal spread that meets all the constraints: for each nature, the EV spreads (in steps of 4,
+    within the 510 cap) that meet them where no spread with fewer EVs in some stat and no more in any other does.
+    Stats no constraint mentions get no EVs. Spreads are sorted by total EVs, then nature, each as a dict of the
+    nature, EVs, total and resulting stats. The mon's level and IVs are used as they are.
+
+    Every nature and EV amount is evaluated at once with arrays, so a query takes milliseconds. Constraints that share
+    a stat (e.g. surviving a physical and a special hit both depend on HP) are searched together, over every
+    combination of their stats' EVs; constraints that don't are searched separately and combined at the end."""
+    require_numpy()
+    natures = spread_natures if natures is None else natures
+    table = stat_table(mon, natures)
+    for constraint in constraints:
+        constraint.prepare(mon)
+
+    group_points = []  # for each group: its stats, and the minimal EV steps of each for each nature
+    for stats, members in constraint_groups(constraints):
+        # natures that give the same values in this group's stats (e.g. all the ones that don't touch them) have the
+        # same answers, so each distinct set of values is only searched once
+        columns = table[:, [six_stats.index(g) for g in stats]].reshape(len(natures), -1)
+        distinct, first, inverse = np.unique(columns, axis=0, return_index=True, return_inverse=True)
+        feasible = np.ones((len(distinct), ) + (len(ev_steps), ) * len(stats), dtype=bool)
+        for constraint in members:
+            order = [constraint.stats.index(g) + 1 for g in stats if g in constraint.stats]
+            shape = [len(distinct)] + [len(ev_steps) if g in constraint.stats else 1 for g in stats]
+            feasible &= constraint.check(table[first]).transpose([0] + order).reshape(shape)
+        points = np.argwhere(minimal_points(feasible))
+        points = [points[points[:, 0] == n, 1:] for n in range(len(distinct))]
+        group_points.append((stats, [points[g] for g in inverse.ravel()]))
+
+    ret = []
+    for n, nature in enumerate(natures):
+        for combination in cartesian_product(*(points[n] for _, points in group_points)):
+            steps = [0] * 6
+            for (stats, _), point in zip(group_points, combination):
+                for stat, step in zip(stats, point):
+                    steps[six_stats.index(stat)] = int(step)
+            if sum(steps) <= max_ev_steps:
+                ret.append({
+                    "nature": nature, "evs": [int(ev_steps[g]) for g in steps], "total": sum(steps) * 4,
+                    "stats": [int(table[n, s, g]) for s, g in enumerate(steps)]
+                })
+    ret.sort(key=lambda g: g["total"])
+    return ret[:limit]
@@ -13,14 +13,14 @@ class Team:
         self.id = kwargs.get("id", -1)
         self.trainer = kwargs.get("trainer", "Trainer")
 
-    def __getitem__(self, item: int) -> dict | None:
+    def __getitem__(self, item: int) -> FieldMon | None:
         return self.mons.get(item)
 
     def __len__(self):
         return len(self.mons)
 
     def json(self):
-        return {"trainer": self.trainer, "mons": [g for g in self.mons.values()]} | \
+        return {"trainer": self.trainer, "mons": [g.json() for g in self.mons.values()]} | \
             ({"id": self.id} if self.id != -1 else {}) | \
             ({"size": self._size} if self._size != 6 else {})
 
@@ -30,9 +30,9 @@ class Team:
 
     def set_mon(self, mon: MiniMon | dict, id_no: int):
         if isinstance(mon, dict):
-            self.mons[id_no] = mon | {"id": id_no}
+            self.mons[id_no] = FieldMon.from_json(mon | {"id": id_no})
         else:
-            self.mons[id_no] = mon.deploy(id=id_no).json()
+            self.mons[id_no] = mon.deploy(id=id_no)
 
     def add_mon(self, mon: MiniMon):
         if len(self.mons) < self._size:
@@ -41,16 +41,31 @@ class Team:
 
     def update_mon(self, mon: FieldMon):
         if mon.id in self.mons:
-            self.mons[mon.id] = mon.json()
+            self.mons[mon.id] = mon
 
     def recall_mon(self, mon: FieldMon):
         if mon.id in self.mons:
-            self.mons[mon.id] = mon.json() | {"field_status": "fainted" if mon.fainted else "benched"}
+            if not mon.fainted:
+                mon.withdraw()
+            mon.field_status = "fainted" if mon.fainted else "benched"
+            self.mons[mon.id] = mon
+
+    def save_state(self) -> tuple:
+        """The roster and each mon's state, for Battle.snapshot(). Extended by subclasses with state."""
+        return self.id, tuple(self.order), tuple((k, v, v.save_state()) for k, v in self.mons.items())
+
+    def load_state(self, state: tuple):
+        self.id, order, mons = state
+        self.order = list(order)
+        self.mons = {}
+        for id_no, mon, mon_state in mons:
+            mon.load_state(mon_state)
+            self.mons[id_no] = mon
 
     def swap_ids(self, id1: int, id2: int):
-        transfer = self.mons[id1]
-        self.mons[id1] = self.mons[id2] | {"id": id1}
-        self.mons[id2] = transfer | {"id": id2}
+        self.mons[id1], self.mons[id2] = self.mons[id2], self.mons[id1]
+        self.mons[id1].id = id1
+        self.mons[id2].id = id2
 
     def swap_positions(self, pos1: int, pos2: int):
         if pos1 != pos2:
@@ -59,26 +74,26 @@ class Team:
     def change_id(self, new_id: int):
         self.id = new_id
         for old_id, mon in list(self.mons.items()):
-            mon["id"] = round(mon["id"] + new_id * self._size)
-            mon["team_id"] = new_id
+            mon.id = round(mon.id + new_id * self._size)
+            mon.team_id = new_id
             del self.mons[old_id]
-            self.mons[mon["id"]] = mon
+            self.mons[mon.id] = mon
         self.order = list(self.mons)
 
     @property
-    def ordered_mons(self) -> list[dict]:
+    def ordered_mons(self) -> list[FieldMon]:
         return [self.mons[g] for g in self.order]
 
-    def at(self, position: int) -> dict:
+    def at(self, position: int) -> FieldMon:
         return self.mons[self.order[position]]
 
     def inline_display(self, ignore: int = 0):
         return "\n".join(
-            f"[{n + 1}] {FieldMon.from_json(g).inline_display()}" +
-            (f" ({g['field_status']})" if g["field_status"] != "benched" else "")
+            f"[{n + 1}] {g.inline_display()}" +
+            (f" ({g.field_status})" if g.field_status != "benched" else "")
             for n, g in enumerate(self.ordered_mons) if n >= ignore
         )
 
     @property
-    def reserves(self) -> list[dict]:
-        return [g for g in self.mons.values() if g["field_status"] == "benched"]
+    def reserves(self) -> list[FieldMon]:
+        return [g for g in self.mons.values() if g.field_status == "benched"]
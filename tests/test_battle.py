@@ -0,0 +1,26 @@
+from battle import *
+
+
+def ruin_battle() -> Battle:
+    random.seed(0)
+    teams = [
+        BasicAI([MiniMon("Chien-Pao", ability="Sword of Ruin", move_names=["Icicle Crash"])], trainer="Team 1"),
+        BasicAI([MiniMon("Garchomp", ability="Rough Skin", move_names=["Earthquake"])], trainer="Team 2")
+    ]
+    battle = Battle(teams, sink=NullSink())
+    battle.init_battle()
+    return battle
+
+
+def test_restore_rebuilds_field_abilities():
+    battle = ruin_battle()
+    ruin, foe = battle.at(0), battle.at(1)
+    defense = battle.field.get_stat(foe, "Def")
+    snapshot = battle.snapshot()
+
+    battle.field.set_ability(ruin, "Inner Focus")
+    assert battle.field.get_stat(foe, "Def") != defense
+
+    battle.restore(snapshot)
+    assert "Sword of Ruin" in battle.field.abilities
+    assert battle.field.get_stat(foe, "Def") == defense
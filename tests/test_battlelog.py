@@ -0,0 +1,30 @@
+from battlelog import *
+from benchmarks import benchmark_teams
+import io
+
+
+def logged_battle(pov: int) -> tuple[bytes, list[str], Battle]:
+    random.seed(0)
+    log, sink = io.BytesIO(), BufferSink(wants_diagrams=False)
+    teams = [BasicAI(g, trainer=f"Team {n + 1}") for n, g in enumerate(benchmark_teams)]
+    battle = Battle(teams, 2, pov, sink=sink, log=BattleLogWriter(log, None))
+    battle.run(100)
+    battle.log.finish()
+    return log.getvalue(), sink.lines, battle
+
+
+def test_log_round_trip():
+    log, lines, battle = logged_battle(0)
+    logged = next(read_battle_logs(io.BytesIO(log)))
+    assert list(logged.lines()) == lines
+    assert len(log) < len("\n".join(lines).encode("utf-8")) / 2
+    for team, pack in zip(battle.teams, logged.team_packs):
+        assert [g.mini_pack() for g in Team.from_json(pack).mons.values()] == \
+            [team.mons[g].mini_pack() for g in sorted(team.mons)]
+
+
+def test_log_renders_either_side():
+    log, _, _ = logged_battle(0)
+    logged = next(read_battle_logs(io.BytesIO(log)))
+    _, lines, _ = logged_battle(1)
+    assert list(LoggedBattle(logged.size, 1, logged.team_packs, logged.events).lines()) == lines
@@ -0,0 +1,26 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from spreads import *
+
+
+def test_knock_out_respects_field_mon_target_stages():
+    attacker = MiniMon("Garchomp", level=50, move_names=["Earthquake"])
+    target = MiniMon("Amoonguss", level=50, evs=[252, 0, 0, 0, 0, 0]).deploy()
+    boosted = MiniMon("Amoonguss", level=50, evs=[252, 0, 0, 0, 0, 0]).deploy()
+    boosted.stat_stages["Def"] = 1
+
+    unboosted = optimize_spread(attacker, [KnockOut(target, "Earthquake", hits=3)])
+    against_boost = optimize_spread(attacker, [KnockOut(boosted, "Earthquake", hits=3)])
+    assert against_boost and unboosted
+    assert against_boost[0]["total"] > unboosted[0]["total"]
+
+    for spread in against_boost:
+        mon = MiniMon("Garchomp", level=50, nature=spread["nature"], evs=spread["evs"],
+                      move_names=["Earthquake"]).deploy()
+        copy = opponent_mon(boosted)
+        assert copy.stat_stages["Def"] == 1
+        field = matchup_field(copy, mon)
+        damage = field.damage_roll(mon, copy, mon.moves["Earthquake"], force_random=0.85, allow_crit=False)["damage"]
+        assert 3 * damage >= copy.remaining_hp
@@ -0,0 +1,246 @@
+from montecarlo import *
+from pokepaste import *
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import SimpleQueue
+from itertools import combinations
+from math import log10
+import argparse
+
+
+def load_pool(paths: list[str]) -> dict[str, tuple[type, str, list[dict]]]:
+    """Reads teams from pokepaste files (which can hold several teams, split by "=== name ===" headers) and JSON files
+    (a Team.json() dict, or a list of them), keyed by a unique name: the team's trainer or header, else the file's."""
+    ret = {}
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".json"):
+                js = json.load(f)
+                teams = [Team.from_json(g) for g in (js if isinstance(js, list) else [js])]
+            else:
+                errors = []
+                teams = list(read_teams(f, errors))
+                if errors:
+                    raise ValueError(f"{path}: {errors[0]}")
+        for n, team in enumerate(teams):
+            name = team.trainer if team.trainer != "Trainer" else stem if len(teams) == 1 else f"{stem} {n + 1}"
+            unique, copies = name, 1
+            while unique in ret:
+                copies += 1
+                unique = f"{name} ({copies})"
+            ret[unique] = team_spec(team, unique)
+    return ret
+
+
+def _play_games(spec1: tuple, spec2: tuple, size: int, games: list[int], seed: int, max_turns: int) -> list[dict]:
+    """Plays games of a pairing, swapping sides on odd-numbered games. Errors are recorded rather than raised, so one
+    bad game doesn't cost the rest of the chunk."""
+    ret = []
+    for n in games:
+        swapped = n % 2 == 1
+        try:
+            battle = run_battle(*((spec2, spec1) if swapped else (spec1, spec2)), size, seed + n, max_turns)
+        except Exception as e:
+            ret.append({"game": n, "error": f"{type(e).__name__}: {e}"})
+            continue
+        winner = battle.check_winner()
+        ret.append({
+            "game": n, "winner": None if winner is None else winner ^ swapped, "turns": battle.turn_count
+        })
+    return ret
+
+
+_started = None  # in workers, where each chunk reports that it's started, so a dead worker's chunks can be told apart
+
+
+def _init_worker(started: SimpleQueue):
+    global _started
+    _started = started
+
+
+def _play_chunk(key: int, *args) -> list[dict]:
+    _started.put(key)
+    return _play_games(*args)
+
+
+def _run_chunks(chunks: list[tuple], specs: dict, size: int, seed: int, max_turns: int, workers: int, record) \
+        -> tuple[list[tuple], list[tuple]]:
+    """Runs chunks of games on a pool, recording each as it finishes. If a worker dies, returns the chunks that never
+    started, and the ones that started but didn't finish; one of those is what killed it."""
+    started = SimpleQueue()
+    lost = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(started, )) as pool:
+        futures = {
+            pool.submit(_play_chunk, n, specs[pair[0]], specs[pair[1]], size, todo, seed, max_turns): n
+            for n, (pair, todo) in enumerate(chunks)
+        }
+        for future in as_completed(futures):
+            try:
+                record(chunks[futures[future]][0], future.result())
+            except BrokenProcessPool:
+                lost.append(futures[future])
+    began = set()
+    while not started.empty():
+        began.add(started.get())
+    return [chunks[g] for g in sorted(lost) if g not in began], [chunks[g] for g in sorted(lost) if g in began]
+
+
+class TournamentResults:
+    """Game results by pairing, as read from and streamed to a results file of JSON lines."""
+
+    def __init__(self, names: list[str]):
+        self.names = list(names)
+        self.games = {}  # (name, name): {game number: (winner as 0/1 for the pair's order or None, turns)}
+        self.errors = {}  # (name, name): {game number: message}
+        self.failed = []  # chunks given up on after crashing their workers too many times
+
+    def add(self, line: dict):
+        pair = tuple(line["teams"])
+        if "error" in line:
+            self.errors.setdefault(pair, {})[line["game"]] = line["error"]
+        else:
+            self.games.setdefault(pair, {})[line["game"]] = (line["winner"], line["turns"])
+
+    def done(self, pair: tuple[str, str]) -> set[int]:
+        return set(self.games.get(pair, ())) | set(self.errors.get(pair, ()))
+
+    def load(self, path: str):
+        """Adds the results already in a results file, skipping a last line cut short by an interrupted run."""
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    line = json.loads(line)
+                except ValueError:
+                    continue
+                if all(g in self.names for g in line["teams"]):
+                    self.add(line)
+
+    def scores(self) -> dict[tuple[str, str], tuple[float, int]]:
+        """(first team's score, games) for each pairing, counting unfinished games as draws."""
+        ret = {}
+        for pair, games in self.games.items():
+            ret[pair] = (sum(1 if g == 0 else 0.5 if g is None else 0 for g, _ in games.values()), len(games))
+        return ret
+
+    def win_rates(self) -> dict[str, dict[str, float]]:
+        ret = {g: {} for g in self.names}
+        for (a, b), (score, games) in self.scores().items():
+            if games:
+                ret[a][b] = score / games
+                ret[b][a] = 1 - score / games
+        return ret
+
+    def ratings(self, iterations: int = 1000) -> dict[str, float]:
+        """Elo ratings, averaging 1500, fit to all the games at once (a Bradley-Terry model), so unlike running Elo
+        updates they don't depend on the order games finished in. Each team gets one virtual draw against an average
+        team, so that a team that never won still gets a finite rating."""
+        scores = {g: 0.5 for g in self.names}
+        games = {g: {} for g in self.names}
+        for (a, b), (score, n) in self.scores().items():
+            scores[a] += score
+            scores[b] += n - score
+            games[a][b] = games[b][a] = n
+        strength = {g: 1.0 for g in self.names}
+        for _ in range(iterations):
+            new = {
+                g: scores[g] / (
+                    1 / (strength[g] + 1) + sum(n / (strength[g] + strength[j]) for j, n in games[g].items())
+                ) for g in self.names
+            }
+            mean = sum(log10(g) for g in new.values()) / len(new)
+            new = {k: v / 10 ** mean for k, v in new.items()}
+            converged = all(abs(new[g] - strength[g]) < 1e-9 for g in self.names)
+            strength = new
+            if converged:
+                break
+        return {g: 1500 + 400 * log10(strength[g]) for g in self.names}
+
+    def json(self):
+        ratings = self.ratings()
+        return {
+            "teams": self.names, "ratings": dict(sorted(ratings.items(), key=lambda g: -g[1])),
+            "win_rates": self.win_rates(),
+            "games": sum(len(g) for g in self.games.values()), "errors": sum(len(g) for g in self.errors.values()),
+            "mean_turns": {
+                f"{a} vs. {b}": sum(j for _, j in games.values()) / len(games)
+                for (a, b), games in self.games.items() if games
+            },
+            "failed": self.failed
+        }
+
+    def summary(self) -> str:
+        ret = [f"{g}: {j:.0f}" for g, j in sorted(self.ratings().items(), key=lambda g: -g[1])]
+        if errors := sum(len(g) for g in self.errors.values()):
+            ret.append(f"{errors} games raised errors")
+        if self.failed:
+            ret.append(f"{len(self.failed)} chunks crashed their workers and were skipped")
+        return "\n".join(ret)
+
+
+def run_tournament(teams: dict[str, Team | list[MiniMon | dict] | tuple], games: int, results_path: str,
+                   size: int = 1, workers: int = None, seed: int = 0, max_turns: int = 500, chunk_size: int = 10,
+                   max_attempts: int = 3) -> TournamentResults:
+    """Plays every pairing of teams games times over a process pool, appending each game to results_path as a line
+    of JSON as its chunk finishes. Games already in the file are skipped, so an interrupted tournament picks up where
+    it left off. Chunks are queued round-robin across pairings, so long and short matchups are spread over the whole
+    run instead of bunching up at the end. If a worker dies, the chunks that hadn't started are queued again, and the
+    ones that had are each retried on their own (up to max_attempts times) to pick out the one that killed it."""
+    specs = {k: v if isinstance(v, tuple) else team_spec(v, k) for k, v in teams.items()}
+    results = TournamentResults(list(specs))
+    results.load(results_path)
+    workers = workers or os.cpu_count() or 1
+
+    chunks = []  # (round, pair, games)
+    for pair in combinations(specs, 2):
+        todo = sorted(set(range(games)) - results.done(pair))
+        chunks.extend((n // chunk_size, pair, todo[n:n + chunk_size]) for n in range(0, len(todo), chunk_size))
+    pending = [chunk[1:] for chunk in sorted(chunks, key=lambda g: g[0])]
+
+    with open(results_path, "a", encoding="utf-8") as out:
+        def record(pair: tuple[str, str], lines: list[dict]):
+            for line in lines:
+                line = {"teams": list(pair)} | line
+                results.add(line)
+                out.write(json.dumps(line) + "\n")
+            out.flush()
+
+        while pending:
+            pending, suspects = _run_chunks(pending, specs, size, seed, max_turns, workers, record)
+            for pair, todo in suspects:  # one of these killed its worker; run each alone to find out which
+                for _ in range(max_attempts):
+                    try:
+                        with ProcessPoolExecutor(max_workers=1) as pool:
+                            record(pair, pool.submit(
+                                _play_games, specs[pair[0]], specs[pair[1]], size, todo, seed, max_turns
+                            ).result())
+                        break
+                    except BrokenProcessPool:
+                        continue
+                else:
+                    results.failed.append({"teams": list(pair), "games": todo})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays a round-robin tournament between teams and rates them.")
+    parser.add_argument("teams", nargs="+", help="pokepaste or Team JSON files")
+    parser.add_argument("--games", type=int, default=100, help="games per pairing")
+    parser.add_argument("--results", default="tournament.jsonl", help="results file, appended to and resumed from")
+    parser.add_argument("--summary", help="where to write ratings and win rates as JSON")
+    parser.add_argument("--size", type=int, default=1, help="1 for singles, 2 for doubles, 3 for triples")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=500)
+    parser.add_argument("--chunk-size", type=int, default=10)
+    args = parser.parse_args()
+
+    tournament = run_tournament(
+        load_pool(args.teams), args.games, args.results, args.size, args.workers, args.seed, args.max_turns,
+        args.chunk_size
+    )
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(tournament.json(), f, indent=2)
+    print(tournament.summary())